@@ -0,0 +1,139 @@
+import hashlib
+import io
+import json
+
+import flask
+import numpy as np
+
+import compression
+import snapshot
+from store import aggregations, frequencyOrder
+
+# SERIES QUERY API
+# /api/series                  -> ids with frequency, range and length
+# /api/series/<id>?start=&end=&freq=&how=&format=json|csv|npy&asof=
+# asof (a date, or 'first' for every observation as first reported) answers a revised series (vintages.py) as it
+# was known then.
+# Responses are streamed in chunks and carry an ETag derived from the data version and the query (suffixed with the
+# encoding when compressed).
+blueprint = flask.Blueprint('api', __name__, url_prefix='/api')
+
+chunkRows = 2048
+formats = {'json': 'application/json', 'csv': 'text/csv', 'npy': 'application/octet-stream'}
+
+
+def apiError(status, message):
+    return flask.jsonify({'error': message}), status
+
+
+def chunks(series):
+    labels = series.labels()
+    for start in range(0, len(series), chunkRows):
+        values = series.values[start:start + chunkRows]
+        yield labels[start:start + chunkRows], values
+
+
+def jsonValues(values):
+    if values.dtype.kind == 'f' and np.isnan(values).any():
+        return np.where(np.isnan(values), None, values.astype(object)).tolist()
+    return values.tolist()
+
+
+def streamJson(series, version):
+    yield '{"id":%s,"freq":%s,"version":%s,"data":[' % (json.dumps(series.seriesId), json.dumps(series.freq),
+                                                       json.dumps(version))
+    separator = ''
+    for labels, values in chunks(series):
+        rows = json.dumps(list(zip(labels.tolist(), jsonValues(values))), separators=(',', ':'))
+        yield separator + rows[1:-1]
+        separator = ','
+    yield ']}'
+
+
+def streamCsv(series):
+    yield 'Date,%s\n' % series.seriesId
+    for labels, values in chunks(series):
+        text = ['%s,%s\n' % (label, '' if value is None else value) for label, value in
+                zip(labels.tolist(), jsonValues(values))]
+        yield ''.join(text)
+
+
+# .npy of a structured (date, value) array, readable with numpy.load
+def streamNpy(series):
+    dtype = np.dtype([('date', '<M8[D]'), ('value', series.values.dtype.newbyteorder('<'))])
+    header = io.BytesIO()
+    np.lib.format.write_array_header_1_0(header, {'descr': np.lib.format.dtype_to_descr(dtype),
+                                                  'fortran_order': False, 'shape': (len(series),)})
+    yield header.getvalue()
+    for start in range(0, len(series), chunkRows):
+        rows = np.empty(len(series.dates[start:start + chunkRows]), dtype=dtype)
+        rows['date'] = series.dates[start:start + chunkRows]
+        rows['value'] = series.values[start:start + chunkRows]
+        yield rows.tobytes()
+
+
+@blueprint.route('/series')
+def listSeries():
+    store = snapshot.get().store
+    return flask.jsonify({seriesId: {'freq': store[seriesId].freq,
+                                     'start': str(store[seriesId].dates[0]),
+                                     'end': str(store[seriesId].dates[-1]),
+                                     'length': len(store[seriesId])} for seriesId in store})
+
+
+@blueprint.route('/series/<seriesId>')
+def getSeries(seriesId):
+    snap = snapshot.get()
+    args = flask.request.args
+    asOf = args.get('asof') or None
+    if asOf is not None:
+        if snap.vintages is None or seriesId not in snap.vintages:
+            return apiError(400 if seriesId in snap.store else 404, 'no recorded releases of %r' % seriesId)
+        if asOf != 'first':
+            try:
+                asOf = str(np.datetime64(asOf, 'D'))
+            except ValueError:
+                return apiError(400, 'asof must be a date or first')
+    elif seriesId not in snap.store:
+        return apiError(404, 'unknown series %r' % seriesId)
+
+    start, end = args.get('start') or None, args.get('end') or None
+    freq, how = args.get('freq') or None, args.get('how', 'last')
+    outputFormat = args.get('format', 'json')
+    if outputFormat not in formats:
+        return apiError(400, 'format must be one of %s' % ', '.join(formats))
+    if freq is not None and freq not in frequencyOrder:
+        return apiError(400, 'freq must be one of %s' % ', '.join(frequencyOrder))
+    if how not in aggregations:
+        return apiError(400, 'how must be one of %s' % ', '.join(aggregations))
+
+    query = '|'.join(str(part) for part in (snap.version, seriesId, start, end, freq, how, outputFormat,
+                                                 asOf))
+    etag = hashlib.sha1(query.encode()).hexdigest()[:24]
+    # compression.compressStream encodes the streamed body and suffixes the ETag with the encoding
+    encoding = compression.negotiate() if formats[outputFormat] in compression.compressibleTypes else None
+    if flask.request.if_none_match.contains(compression.encodedTag(etag, encoding)):
+        response = flask.Response(status=304)
+        etag = compression.encodedTag(etag, encoding)
+    else:
+        try:
+            series = snap.store[seriesId] if asOf is None else snap.vintages.asOf(seriesId, asOf)
+            if series is None:
+                return apiError(404, '%r was not released by %s' % (seriesId, asOf))
+            series = series.slice(start, end)
+            if freq is not None:
+                series = series.resample(freq, how)
+        except ValueError as error:
+            return apiError(400, str(error))
+
+        if outputFormat == 'json':
+            body = streamJson(series, snap.version)
+        elif outputFormat == 'csv':
+            body = streamCsv(series)
+        else:
+            body = streamNpy(series)
+        response = flask.Response(body, mimetype=formats[outputFormat])
+    response.set_etag(etag)
+    response.vary.add('Accept-Encoding')
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
@@ -1,605 +1,756 @@
+import json
+import os
+import time
+
 import dash
 import dash_core_components as dcc
 import dash_html_components as html
-import plotly.express as px
-import plotly.graph_objs as go
-from plotly.subplots import make_subplots
-import pandas as pd
-import numpy as np
-from datetime import date, timedelta
-
-# COLORS & STYLE OF GRAPHS
-backgroundColor = 'white'
-textColor = '#282A2A'
-highlightColor = 'lightsteelblue'
-colorOne = 'mediumaquamarine'
-colorTwo = 'cornflowerblue'
-colorThree = 'indianred'
-
-quadBoxStyle = {'text-align': 'center',
-                'border': '1px #f9f9f9 solid',
-                'border-radius': 10,
-                'box-shadow': '10px 5px 8px #e6e6e6',
-                'background-color': 'white',
-                'padding': '2px'}
-
-tabsStyle = {'border': '1px #f9f9f9 solid',
-             'border-radius': 10,
-             'box-shadow': '10px 5px 8px #e6e6e6',
-             'background-color': 'white',
-             'padding': '20px',
-             'text-color': textColor}
-
-tabColors = {'border': 'white',
-             'primary': highlightColor,
-             'background': 'ghostwhite'}
-
-xaxisYearlyStyle = {'showline': True,
-                    'showgrid': False,
-                    'linecolor': textColor,
-                    'type': 'date',
-                    'tickformat': '%Y',
-                    'ticks': 'outside'}
-
-xaxisMonthlyStyle = {'showline': True,
-                     'showgrid': False,
-                     'linecolor': textColor,
-                     'type': 'date',
-                     'tickformat': '%b %d',
-                     'ticks': 'outside'}
-
-yaxisStyle = {'fixedrange': True,
-              'showline': False,
-              'linecolor': textColor,
-              'showgrid': True,
-              'gridcolor': '#e1e1e1'}
-
-yaxisPercentStyle = {'title': '%',
-                     'fixedrange': True,
-                     'showline': False,
-                     'linecolor': textColor,
-                     'showgrid': True,
-                     'gridcolor': '#e1e1e1'}
-
-marginStyle = {'t': 50, 'l': 20, 'r': 20}
-
-legendStyle = {'yanchor': 'bottom',
-               'y': 1.01,
-               'xanchor': 'center',
-               'x': .90}
-
-headerStyle = {'letter-spacing': '2px',
-               'font-weight': 'lighter',
-               'text-align': 'left'
-               }
-
-#
-
-# DATE VARIABLES
-today = date.today()
-
-thisYear = str(date.today().year)
-
-thisMonth = date.today().month
-lastMonth = '0' + str(thisMonth - 1)
-twoMonthsAgo = '0' + str(thisMonth - 2)
-
-lastSaturday = today - timedelta(days=today.weekday()) + timedelta(days=5, weeks=-1)
-twoSatsAgo = lastSaturday + timedelta(weeks=-1)
-threeSatsAgo = twoSatsAgo + timedelta(weeks=-1)
-
-# If today is Mon,Tues,Wed then use appropriate 'week-ending' dates for initial and continuing claims
-if today.weekday() in {0, 1, 2}:
-    initialClaimsWeekEndingSat = twoSatsAgo.strftime('%Y-%m-%d')
-    continuedClaimsWeekEndingSat = threeSatsAgo.strftime('%Y-%m-%d')
-else:
-    initialClaimsWeekEndingSat = lastSaturday.strftime('%Y-%m-%d')
-    continuedClaimsWeekEndingSat = twoSatsAgo.strftime('%Y-%m-%d')
+from dash.dependencies import Input, Output, State
+from dash.exceptions import PreventUpdate
+import flask
+
+import api
+import claims
+import compression
+import downsample
+import encoding
+import figures
+import metrics
+import payloads
+import sectors
+import snapshot
+import store
+import vintages
+from styles import (backgroundColor, textColor, highlightColor, quadBoxStyle, tabsStyle, tabColors, headerStyle,
+                    yaxisPerCapitaTitle)
 
 # SERVER AND APP SETUP
+# createApp (APP FACTORY, at the end) builds the Dash app and registers its callbacks and routes. Importing this
+# module only creates the app `gunicorn app:server` serves: the data is loaded by the first request, or by the
+# gunicorn master before it forks (gunicorn.conf.py), and pandas and the figure encoders are imported on first use.
 external_stylesheets = ['https://codepen.io/chriddyp/pen/bWLwgP.css']
-app = dash.Dash(__name__, external_stylesheets=external_stylesheets)
-server = app.server
-app.title = 'The Indicator App'  # tab on top of browser
-
-# SPREADSHEETS
-ICSA_df = pd.read_csv('https://raw.githubusercontent.com/cansu-freeman/indicator-app/master/data/fredICSA.csv',
-                      header=0)
-ICSA_historical = pd.read_csv(
-    'https://raw.githubusercontent.com/cansu-freeman/indicator-app/master/data/ICSA_historical.csv', header=0)
-CCSA_df = pd.read_csv('https://raw.githubusercontent.com/cansu-freeman/indicator-app/master/data/fredCCSA.csv',
-                      header=0)
-unemploymentRate_df = pd.read_csv(
-    'https://raw.githubusercontent.com/cansu-freeman/indicator-app/master/data/unemploymentRate.csv', header=0)
-u6_df = pd.read_csv('https://raw.githubusercontent.com/cansu-freeman/indicator-app/master/data/U6unemployment.csv',
-                    header=0)
-payrollJobs_df = pd.read_csv(
-    'https://raw.githubusercontent.com/cansu-freeman/indicator-app/master/data/PayrollJobs.csv', header=0)
-jobsBySector_MoM_df = pd.read_csv(
-    'https://raw.githubusercontent.com/cansu-freeman/indicator-app/master/data/payroll-jobs-by-sector/jobsSector_MoM'
-    '.csv',
-    header=0)
-jobsBySector_MoY_df = pd.read_csv(
-    'https://raw.githubusercontent.com/cansu-freeman/indicator-app/master/data/payroll-jobs-by-sector/jobsSector_MoY'
-    '.csv',
-    header=0)
-realGDP_df = pd.read_csv('https://raw.githubusercontent.com/cansu-freeman/indicator-app/master/data/realGDP.csv',
-                         header=0)
-
-# KEY INDICATORS AS VARIABLES
-totalInitialClaims = ICSA_df['ICSA'].sum()
-totalInitialClaims = (totalInitialClaims / 1000000).round(1)
-
-lastWeekClaims = ICSA_df.loc[ICSA_df['Date'] == initialClaimsWeekEndingSat, 'in_millions'].values[0].round(2)
-lastWeekClaims = lastWeekClaims*1000
-
-CCSA_df['Date'] = CCSA_df['Date'].astype(str)
-totalContinuedClaims = CCSA_df.loc[CCSA_df['Date'] == continuedClaimsWeekEndingSat, 'in_millions'].values[0].round(1)
-
-currentUnempRate = unemploymentRate_df.loc[unemploymentRate_df['Date'] == thisYear + '-09', 'Unemployment Rate'].sum()
-
-# fig1: Recent Initial and Continued Claims for Unemployment Nationally
-fig1 = go.Figure()
-fig1.add_trace(go.Scatter(x=ICSA_df['Date'], y=ICSA_df['ICSA'],
-                          mode='lines',
-                          name='Initial Claims',
-                          line_color=colorOne))
-fig1.add_trace(go.Scatter(x=ICSA_df['Date'], y=CCSA_df['CCSA'],
-                          mode='lines',
-                          name='Continuing Claims',
-                          line_color=colorTwo))
-fig1.update_layout(
-    font={'family': 'Futura, Trebuchet MS, Verdana, Sans-serif'},
-    xaxis=xaxisMonthlyStyle,
-    yaxis=yaxisStyle,
-    margin=marginStyle,
-    paper_bgcolor='white',
-    plot_bgcolor='white',
-    legend=legendStyle
-)
-
-# fig2: Historical Initial Claims Nationally
-fig2 = go.Figure()
-fig2.add_trace(go.Bar(x=ICSA_historical['Date'], y=ICSA_historical['ICSA'],
-                      name='Initial Claims',
-                      marker_color=colorOne
-                      ))
-fig2.update_layout(
-    font={'family': 'Futura, Trebuchet MS, Verdana, Sans-serif'},
-    xaxis=xaxisYearlyStyle,
-    yaxis=yaxisStyle,
-    margin=marginStyle,
-    paper_bgcolor='white',
-    plot_bgcolor='white',
-    legend=legendStyle,
-    hovermode='x'
-)
-
-# fig3: Unemployment Rate since 2007
-fig3 = go.Figure()
-fig3.add_trace(go.Bar(x=unemploymentRate_df['Date'], y=unemploymentRate_df['Unemployment Rate'],
-                      name='Unemployment Rate',
-                      marker_color=colorOne))
-fig3.update_layout(
-    font={'family': 'Futura, Trebuchet MS, Verdana, Sans-serif'},
-    xaxis=xaxisYearlyStyle,
-    yaxis=yaxisPercentStyle,
-    margin=marginStyle,
-    paper_bgcolor='white',
-    plot_bgcolor='white',
-    legend=legendStyle,
-    hovermode='x'
-)
-
-# fig4: U6 Unemployment Rate
-fig4 = go.Figure()
-fig4.add_trace(go.Scatter(x=u6_df['Date'], y=u6_df['U6'],
-                          mode='lines',
-                          name='U6',
-                          line_color=colorTwo))
-fig4.add_trace(go.Scatter(x=unemploymentRate_df['Date'], y=unemploymentRate_df['Unemployment Rate'],
-                          mode='lines',
-                          name='Unemployment Rate',
-                          line_color=colorOne))
-fig4.update_layout(
-    font={'family': 'Futura, Trebuchet MS, Verdana, Sans-serif'},
-    xaxis=xaxisYearlyStyle,
-    yaxis=yaxisPercentStyle,
-    margin=marginStyle,
-    paper_bgcolor='white',
-    plot_bgcolor='white',
-    legend=legendStyle,
-    hovermode='x unified'
-)
-
-# fig5: Payroll Jobs
-fig5 = go.Figure()
-fig5.add_trace(go.Bar(x=payrollJobs_df['Date'], y=payrollJobs_df['12M Change'],
-                      name='MoY Change in Payroll Jobs',
-                      marker_color=colorTwo))
-fig5.update_layout(
-    font={'family': 'Futura, Trebuchet MS, Verdana, Sans-serif'},
-    xaxis=xaxisYearlyStyle,
-    yaxis=yaxisStyle,
-    margin=marginStyle,
-    paper_bgcolor='white',
-    plot_bgcolor='white',
-    legend=legendStyle,
-    hovermode='x'
-)
-
-# fig6: Month to Month Payroll Jobs Change
-fig6 = go.Figure()
-fig6.add_trace(go.Bar(x=payrollJobs_df['Date'], y=payrollJobs_df['1M Change'],
-                      name='MoY Change in Payroll Jobs',
-                      marker_color=colorTwo))
-fig6.update_layout(
-    font={'family': 'Futura, Trebuchet MS, Verdana, Sans-serif'},
-    xaxis=xaxisYearlyStyle,
-    yaxis=yaxisStyle,
-    margin=marginStyle,
-    paper_bgcolor='white',
-    plot_bgcolor='white',
-    legend=legendStyle,
-    hovermode='x'
-)
-
-# fig7: Recent Month Change Payroll Jobs by Sector
-# Prepping DF
-jobsBySector_MoM_df = jobsBySector_MoM_df.rename(columns={'Unnamed: 0': 'Sector'})  # have to rename because of github
-jobsBySector_MoM_df['Sector'].replace({'fedGovt 1M': 'Federal Govt',
-                                       'eduHealth 1M': 'Education & Health Services',
-                                       'profBusServ 1M': 'Professional Business Services',
-                                       'leisureHosp 1M': 'Leisure & Hospitality',
-                                       'retailTrade 1M': 'Retail Trade',
-                                       'mfg 1M': 'Manufacturing',
-                                       'financial 1M': 'Financial',
-                                       'constr 1M': 'Construction',
-                                       'wholesale 1M': 'Wholesale Trade',
-                                       'other 1M': 'Other Servies',
-                                       'transp 1M': 'Transportation',
-                                       'info 1M': 'Information'}, inplace=True)
-jobsBySector_MoM_df['Color'] = np.where(jobsBySector_MoM_df[thisYear + '-08'] < 0, colorThree, colorOne)
-
-fig7 = go.Figure()
-fig7.add_trace(go.Bar(x=jobsBySector_MoM_df[thisYear + '-08'], y=jobsBySector_MoM_df['Sector'],
-                      text=(jobsBySector_MoM_df[thisYear + '-08'] / 1000).round(1),
-                      textposition='outside',
-                      orientation='h',
-                      marker_color=jobsBySector_MoM_df['Color']))
-fig7.update_layout(
-    font={'family': 'Futura, Trebuchet MS, Verdana, Sans-serif'},
-    xaxis={
-        'title': 'Number of Jobs',
-        'showline': True,
-        'showgrid': True,
-        'gridcolor': '#e1e1e1',
-        'linecolor': textColor
-    },
-    margin=marginStyle,
-    paper_bgcolor='white',
-    plot_bgcolor='white',
-    legend=legendStyle
-)
-
-# fig8: Recent Yearly (MoY) Change Payroll Jobs by Sector
-# Preparing DF
-jobsBySector_MoY_df = jobsBySector_MoY_df.rename(columns={'Unnamed: 0': 'Sector'})
-jobsBySector_MoY_df['Sector'].replace({'fedGovt 12M': 'Federal Govt',
-                                       'eduHealth 12M': 'Education & Health Services',
-                                       'profBusServ 12M': 'Professional Business Services',
-                                       'leisureHosp 12M': 'Leisure & Hospitality',
-                                       'retailTrade 12M': 'Retail Trade',
-                                       'mfg 12M': 'Manufacturing',
-                                       'financial 12M': 'Financial',
-                                       'constr 12M': 'Construction',
-                                       'wholesale 12M': 'Wholesale Trade',
-                                       'other 12M': 'Other Servies',
-                                       'transp 12M': 'Transportation',
-                                       'info 12M': 'Information'}, inplace=True)
-
-jobsBySector_MoY_df['Color'] = np.where(jobsBySector_MoY_df[thisYear + '-08'] < 0, colorThree, colorOne)
-
-fig8 = go.Figure()
-fig8.add_trace(go.Bar(x=jobsBySector_MoY_df[thisYear + '-08'], y=jobsBySector_MoY_df['Sector'],
-                      text=(jobsBySector_MoY_df[thisYear + '-08'] / 1000).round(1),
-                      textposition='outside',
-                      orientation='h',
-                      marker_color=jobsBySector_MoY_df['Color']))
-fig8.update_layout(
-    font={'family': 'Futura, Trebuchet MS, Verdana, Sans-serif'},
-    xaxis={
-        'title': 'Number of Jobs',
-        'showline': True,
-        'showgrid': True,
-        'gridcolor': '#e1e1e1',
-        'linecolor': textColor
-    },
-    margin=marginStyle,
-    paper_bgcolor='white',
-    plot_bgcolor='white',
-    legend=legendStyle
-)
-
-# fig9: Percent Change per Quarter Real GDP
-# negative values to be red and positive green
-realGDP_df['Color'] = np.where(realGDP_df['Percent Change'] < 0, colorThree, colorOne)
-
-fig9 = go.Figure()
-fig9.add_trace(go.Bar(x=realGDP_df['Date'], y=realGDP_df['Percent Change'],
-                      name='Percent Change',
-                      marker_color=realGDP_df['Color']))
-fig9.update_layout(
-    font={'family': 'Futura, Trebuchet MS, Verdana, Sans-serif'},
-    xaxis=xaxisYearlyStyle,
-    yaxis=yaxisPercentStyle,
-    margin=marginStyle,
-    paper_bgcolor='white',
-    plot_bgcolor='white',
-    legend=legendStyle,
-    hovermode='x'
-)
-
-# fig10: Quarterly Real GDP (trillions)
-
-fig10 = go.Figure()
-fig10.add_trace(go.Scatter(x=realGDP_df['Date'], y=realGDP_df['Real GDP'],
-                           name='Real GDP',
-                           mode='lines',
-                           line_color=colorTwo))
-fig10.update_layout(
-    font={'family': 'Futura, Trebuchet MS, Verdana, Sans-serif'},
-    xaxis=xaxisYearlyStyle,
-    yaxis=yaxisStyle,
-    margin=marginStyle,
-    paper_bgcolor='white',
-    plot_bgcolor='white',
-    legend=legendStyle,
-    hovermode='x'
-)
 
 ################ APPLICATION #################
 
-app.layout = html.Div(children=[
-
-    html.Div([
-        html.Img(src=app.get_asset_url('icon.png'), alt='The Indicator App Logo', style={
-            'width': '100px',
-            'height': '100px',
-        }),
-        html.H1('The Indicator  ', style={'display': 'inline-block',
-                                          'width': '65%',
-                                          'color': '#282A2A',
-                                          'font-weight': 'bold'}),
-        # html.Button(['VIEW ON ',
-        #         html.A('GITHUB', href = 'https://github.com/cansu-freeman/indicator-app',
-        #             style = {'color': highlightColor}
-        #         )
-        # ], style = {'display': 'inline-block',
-        #             'width': '166px',
-        #             'height': '40px'}
-        # ),
-    ],
-        style={'background': 'white',
-               'width': '100%'}
-    ),
-
-    html.Br(),
-    html.Br(),
-
-    html.Div([
-        html.H4('UNEMPLOYMENT SITUATION',
-                style=headerStyle),
-    ]),
-
-    # QUADBOX INDICATORS AT TOP
-    html.Div([
+sectionTitles = {'unemployment': 'UNEMPLOYMENT SITUATION', 'jobs': 'JOBS REPORT', 'gdp': 'GROSS DOMESTIC PRODUCT'}
+
+# section -> [(tab value, label)]; the contents of each tab are in tabContent below
+tabLabels = {
+    'unemployment': [('recent-nemployment', 'Unemployment Claims'),
+                     ('unemployment-rate', 'Unemployment Rate'),
+                     ('u6-unemployment', 'Comparing U6'),
+                     ('historical-initial-claims', 'Historical Initial Claims'),
+                     ('claims-recession-analog', '2020 vs 2008'),
+                     ('claims-zscore', 'Unusual Weeks'),
+                     ('state-claims', 'Claims by State')],
+    'jobs': [('annual-jobs-change', 'Annual Jobs Change'),
+             ('monthly-jobs-change', 'Monthly Jobs Change'),
+             ('sector-MoM', 'Current Month Job Change by Sector'),
+             ('sector-MoY', 'One Year Job Change by Sector'),
+             ('sector-explorer', 'Sector Explorer'),
+             ('revisions', 'Revisions')],
+    'gdp': [('gdp-percent-change', 'Real GDP Percent Change'),
+            ('real-gdp', 'Quarterly Real GDP')],
+}
+
+defaultTabs = {'unemployment': 'recent-nemployment', 'jobs': 'annual-jobs-change', 'gdp': 'gdp-percent-change'}
+
+
+# tab value -> the snapshot field it needs: the tab is only offered once there is state data / a recorded release
+optionalTabs = {'state-claims': 'stateClaims', 'revisions': 'vintages'}
+
+
+def sectionTabs(section, snap):
+    return [(tab, label) for tab, label in tabLabels[section]
+            if tab not in optionalTabs or getattr(snap, optionalTabs[tab]) is not None]
+
+
+# DATE RANGE
+# One date range re-scopes every time-series chart. The presets resolve to fixed dates, so everyone who picks
+# "Since 2020" shares the cached slices, figures and payloads (keyed by range and data version); the picker takes
+# any range.
+datePresets = [('All', 'all'), ('Since 2007', '2007'), ('Since 2020', '2020'), ('Year to date', 'ytd')]
+defaultDatePreset = 'all'
+dateRangeStates = [State('date-range', 'start_date'), State('date-range', 'end_date')]
+dateRangeInputs = [Input('date-range', 'start_date'), Input('date-range', 'end_date')]
+dateRangeProps = ['date-range.start_date', 'date-range.end_date']
+
+
+# First and last date of any series
+def dataBounds(snap):
+    return (min(snap.store[seriesId].dates[0] for seriesId in store.definitions),
+            max(snap.store[seriesId].dates[-1] for seriesId in store.definitions))
+
+
+def presetRange(preset, snap):
+    if preset == 'all':
+        return store.fullRange
+    if preset == 'ytd':
+        return store.dateRange(dataBounds(snap)[1].astype('datetime64[Y]'))
+    return store.dateRange(preset + '-01-01')
+
+
+# The range picked in the browser; one that does not parse is the full range
+def selectedRange(start=None, end=None):
+    try:
+        return store.dateRange(start, end)
+    except ValueError:
+        return store.fullRange
+
+
+def buildLayout(snap):
+    kpis = snap.kpis
+    first, last = dataBounds(snap)
+    return html.Div(children=[
+
+        dcc.Store(id='viewport-width'),
+
+        html.Div([
+            html.Img(src=app.get_asset_url('icon.png'), alt='The Indicator App Logo', style={
+                'width': '100px',
+                'height': '100px',
+            }),
+            html.H1('The Indicator  ', style={'display': 'inline-block',
+                                              'width': '65%',
+                                              'color': '#282A2A',
+                                              'font-weight': 'bold'}),
+            # html.Button(['VIEW ON ',
+            #         html.A('GITHUB', href = 'https://github.com/cansu-freeman/indicator-app',
+            #             style = {'color': highlightColor}
+            #         )
+            # ], style = {'display': 'inline-block',
+            #             'width': '166px',
+            #             'height': '40px'}
+            # ),
+        ],
+            style={'background': 'white',
+                   'width': '100%'}
+        ),
+
+        # DATE RANGE OF EVERY CHART
         html.Div([
-            html.Br(),
-            html.H3(str(totalInitialClaims) + ' M'),
-            html.P(['Total Claims', html.Br(), 'since March']),
-            html.Br(),
-        ], style=quadBoxStyle, className='four columns'),
+            dcc.RadioItems(id='date-range-preset', value=defaultDatePreset,
+                           options=[{'label': label, 'value': preset} for label, preset in datePresets],
+                           labelStyle=inlineStyle, style=inlineStyle),
+            dcc.DatePickerRange(id='date-range', min_date_allowed=str(first), max_date_allowed=str(last),
+                                display_format='YYYY-MM-DD', clearable=True),
+        ]),
+
+        html.Br(),
+        html.Br(),
 
         html.Div([
-            html.Br(),
-            html.H3(str(totalContinuedClaims) + ' M'),
-            html.P(['Continuing', html.Br(), 'Claims']),
-            html.Br(),
-        ], style=quadBoxStyle, className='four columns'),
+            html.H4(sectionTitles['unemployment'],
+                    style=headerStyle),
+        ]),
 
+        # QUADBOX INDICATORS AT TOP
+        html.Div([
+            html.Div([
+                html.Br(),
+                html.H3(str(kpis['totalInitialClaims']) + ' M'),
+                html.P(['Total Claims', html.Br(), 'since March']),
+                html.Br(),
+            ], style=quadBoxStyle, className='four columns'),
+
+            html.Div([
+                html.Br(),
+                html.H3(str(kpis['totalContinuedClaims']) + ' M'),
+                html.P(['Continuing', html.Br(), 'Claims']),
+                html.Br(),
+            ], style=quadBoxStyle, className='four columns'),
+
+            html.Div([
+                html.Br(),
+                html.H3(str(kpis['lastWeekClaims']) + ' k'),
+                html.P(['New Claims Filed', html.Br(), 'Last Week']),
+                html.Br(),
+            ], style=quadBoxStyle, className='four columns'),
+
+            html.Div([
+                html.Br(),
+                html.H3(str(kpis['currentUnempRate']) + ' %'),
+                html.P(['Unemployment Rate', html.Br(), kpis['unempRateMonth']]),
+                html.Br(),
+            ], style=quadBoxStyle, className='four columns')
+
+        ], style={
+            'width': '100%',
+            'display': 'flex',
+            'align-items': 'center',
+            'justify-content': 'center'}, className='row'),
+
+        html.Br(),
+
+        # TABBED UNEMPLOYMENT GRAPHS
         html.Div([
-            html.Br(),
-            html.H3(str(lastWeekClaims) + ' k'),
-            html.P(['New Claims Filed', html.Br(), 'Last Week']),
-            html.Br(),
-        ], style=quadBoxStyle, className='four columns'),
+            dcc.Tabs(id='unemployment-tabs', value=defaultTabs['unemployment'],
+                     children=[dcc.Tab(label=label, value=tab) for tab, label in sectionTabs('unemployment', snap)],
+                     colors=tabColors),
+            html.Div(id='unemployment-tab-content')
+
+        ], style=tabsStyle),
 
+        html.Br(),
+
+        html.Br(),
+
+        # TABBED JOBS GRAPHS
         html.Div([
-            html.Br(),
-            html.H3(str(currentUnempRate) + ' %'),
-            html.P(['Unemployment Rate', html.Br(), 'November 2020']),
-            html.Br(),
-        ], style=quadBoxStyle, className='four columns')
+            html.H4(sectionTitles['jobs'],
+                    style=headerStyle),
+        ]),
 
-    ], style={
-        'width': '100%',
-        'display': 'flex',
-        'align-items': 'center',
-        'justify-content': 'center'}, className='row'),
-
-    html.Br(),
-
-    # TABBED UNEMPLOYMENT GRAPHS
-    html.Div([
-        dcc.Tabs([
-
-            dcc.Tab(label='Unemployment Claims', children=[
-                html.H6('Recent National Unemployment Claims (seasonally adjusted)'),
-                dcc.Graph(
-                    id='recent-nemployment',
-                    figure=fig1
-                ),
-                html.P(
-                    'Initial claims measure emerging unemployment. Continuing claims is the number of people '
-                    'receiving unemployment benefits who have already filed an initial claim.  In order to be '
-                    'included in continuing claims, the person must have been covered by unemployment insurance and '
-                    'be currently receiving benefits. He or she must have been unemployed for at least a week after '
-                    'filing the initial claim, per Department of Labor specifications.')
-            ]),
+        html.Div([
+            dcc.Tabs(id='jobs-tabs', value=defaultTabs['jobs'],
+                     children=[dcc.Tab(label=label, value=tab) for tab, label in sectionTabs('jobs', snap)],
+                     colors=tabColors),
+            html.Div(id='jobs-tab-content')
 
-            dcc.Tab(label='Unemployment Rate', children=[
-                html.H6('National Unemployment Rate, Month to Month'),
-                dcc.Graph(
-                    id='unemployment-rate',
-                    figure=fig3
-                ),
-                html.P(
-                    'The unemployment rate measures the share of the labor force that is not currently employed but '
-                    'could be. It is expressed as a percentage.')
-            ]),
+        ], style=tabsStyle),
 
-            dcc.Tab(label='Comparing U6', children=[
-                html.H6('U6 Unemployment Compared to Standard Measure of Unemployment'),
-                dcc.Graph(
-                    id='u6-unemployment',
-                    figure=fig4
-                ),
-                html.P(
-                    'There are alternative measures of unemployment. The "U6" measures total unemployed, plus all '
-                    'persons marginally attached to the labor force, plus total employed part time for economic '
-                    'reasons, as a percent of the civilian labor force plus all persons marginally attached to the '
-                    'labor force.')
-            ]),
+        html.Br(),
 
-            dcc.Tab(label='Historical Initial Claims', children=[
-                html.H6('Weekly Initial Unemployment Claims since 2007'),
-                dcc.Graph(
-                    id='historical-initial-claims',
-                    figure=fig2
-                ),
-                html.P(
-                    'Recall that the last recession in the United States occured from the end of 2007 to the middle '
-                    'of 2009.')
-            ])
-
-        ], colors=tabColors)
-
-    ], style=tabsStyle),
-
-    html.Br(),
-
-    html.Br(),
-
-    # TABBED JOBS GRAPHS
-    html.Div([
-        html.H4('JOBS REPORT',
-                style=headerStyle),
-    ]),
-
-    html.Div([
-        dcc.Tabs([
-
-            dcc.Tab(label='Annual Jobs Change', children=[
-                html.H6('Annual Payroll Jobs Change, Month over Year'),
-                dcc.Graph(
-                    id='annual-jobs-change',
-                    figure=fig5
-                ),
-                html.P(
-                    "This is showing the change in the amount of Payroll Jobs each month from the corresponding month "
-                    "a year prior.")
-            ]),
+        html.Br(),
 
-            dcc.Tab(label='Monthly Jobs Change', children=[
-                html.H6('Monthly Payroll Jobs Change'),
-                dcc.Graph(
-                    id='monthly-jobs-change',
-                    figure=fig6
-                ),
-                html.P("This chart shows month-to-month change in payroll jobs.")
-            ]),
+        # TABBED GDP GRAPHS
+        html.Div([
+            html.H4(sectionTitles['gdp'],
+                    style=headerStyle),
+        ]),
+        html.Div([
+            dcc.Tabs(id='gdp-tabs', value=defaultTabs['gdp'],
+                     children=[dcc.Tab(label=label, value=tab) for tab, label in sectionTabs('gdp', snap)],
+                     colors=tabColors),
+            html.Div(id='gdp-tab-content')
+
+        ], style=tabsStyle),
 
-            dcc.Tab(label='Current Month Job Change by Sector', children=[
-                html.H6("Payroll Job Change by Sector for September 2020 (in thousands 000's)"),
-                dcc.Graph(
-                    id='sector-MoM',
-                    figure=fig7,
-                    config={'staticPlot': True}
-                ),
-                html.P('This chart represents the change in number of jobs for the month of September.')
+        html.Br(),
+
+        # SOURCES
+        html.Div([
+            html.P([
+                html.A('Developed by Cansu Freeman', href='https://cansufreeman.com',
+                       style={'color': highlightColor})
             ]),
+            html.P('Sources: Bureau of Labor Statistics and Federal Reserve Economic Data'),
+        ], style={'width': '100%', 'text-align': 'right'}),
+
+        html.Br()
 
-            dcc.Tab(label='One Year Job Change by Sector', children=[
-                html.H6("Payroll Job Change by Sector from Sep 2019 to Sep 2020"),
-                dcc.Graph(
-                    id='sector-MoY',
-                    figure=fig8,
-                    config={'staticPlot': True}
-                ),
-                html.P('This represents the change in jobs per sector over the last year.')
-            ])
-
-        ], colors=tabColors)
-
-    ], style=tabsStyle),
-
-    html.Br(),
-
-    html.Br(),
-
-    # TABBED GDP GRAPHS
-    html.Div([
-        html.H4('GROSS DOMESTIC PRODUCT',
-                style=headerStyle),
-    ]),
-    html.Div([
-        dcc.Tabs([
-
-            dcc.Tab(label='Real GDP Percent Change', children=[
-                html.H6('Quarterly Real GDP Percent Change From Last Quarter'),
-                dcc.Graph(
-                    id='gdp-percent-change',
-                    figure=fig9
-                ),
-                html.P(' ')
+    ], style={
+        'backgroundColor': backgroundColor,
+        'padding': '10px',
+        'color': textColor,
+        'font-family': 'Futura, Trebuchet MS, Verdana, Sans-serif',
+        'font-weight': ''})
+
+
+def serveLayout():
+    return buildLayout(snapshot.get())
+
+
+################ TABS #################
+# Each tab's graph is only built (and sent) when the tab is selected: tab value -> (title, figure, text, config).
+# Titles and text are formatted with the snapshot's KPIs.
+
+tabContent = {
+    'recent-nemployment': ('Recent National Unemployment Claims (seasonally adjusted)', 'fig1',
+                           'Initial claims measure emerging unemployment. Continuing claims is the number of '
+                           'people receiving unemployment benefits who have already filed an initial claim.  In '
+                           'order to be included in continuing claims, the person must have been covered by '
+                           'unemployment insurance and be currently receiving benefits. He or she must have been '
+                           'unemployed for at least a week after filing the initial claim, per Department of Labor '
+                           'specifications.', None),
+    'unemployment-rate': ('National Unemployment Rate, Month to Month', 'fig3',
+                          'The unemployment rate measures the share of the labor force that is not currently '
+                          'employed but could be. It is expressed as a percentage.', None),
+    'u6-unemployment': ('U6 Unemployment Compared to Standard Measure of Unemployment', 'fig4',
+                        'There are alternative measures of unemployment. The "U6" measures total unemployed, plus all '
+                        'persons marginally attached to the labor force, plus total employed part time for economic '
+                        'reasons, as a percent of the civilian labor force plus all persons marginally attached to '
+                        'the labor force.', None),
+    'historical-initial-claims': ('Weekly Initial Unemployment Claims since 2007', 'fig2',
+                                  'Recall that the last recession in the United States occured from the end of 2007 '
+                                  'to the middle of 2009.', None),
+    'claims-recession-analog': ('Weekly Initial Claims: 2020 against 2008, from the start of each recession',
+                                'fig11', 'The 2008 line is the weekly claims from December 2007, when the Great '
+                                'Recession began, moved forward to line up with February 2020.', None),
+    'claims-zscore': ('How Unusual Each Week of Initial Claims Was', 'fig12',
+                      'Each bar is how far that week\'s initial claims were from the average of the 52 weeks '
+                      'before it, in standard deviations of those weeks.', None),
+    'annual-jobs-change': ('Annual Payroll Jobs Change, Month over Year', 'fig5',
+                           'This is showing the change in the amount of Payroll Jobs each month from the '
+                           'corresponding month a year prior.', None),
+    'monthly-jobs-change': ('Monthly Payroll Jobs Change', 'fig6',
+                            'This chart shows month-to-month change in payroll jobs.', None),
+    'sector-MoM': ("Payroll Job Change by Sector for {sectorMonthName} (in thousands 000's)", 'fig7',
+                   'This chart represents the change in number of jobs for the month of {sectorMonthName}.',
+                   {'staticPlot': True}),
+    'sector-MoY': ('Payroll Job Change by Sector from {sectorYearAgoShort} to {sectorMonthShort}', 'fig8',
+                   'This represents the change in jobs per sector over the last year.', {'staticPlot': True}),
+    'gdp-percent-change': ('Quarterly Real GDP Percent Change From Last Quarter', 'fig9', ' ', None),
+    'real-gdp': ('Real GDP per Quarter (in trillions)', 'fig10', ' ', None),
+    # only offered once ingest.py has fetched the state files; the figure follows the state and aggregation pickers
+    'state-claims': ('Weekly Initial Unemployment Claims by State (not seasonally adjusted)', None,
+                     'Pick any number of states (none selects all of them), weekly claims or their 4-week average, '
+                     'and the total or the total per 100,000 residents (2020 Census).', None),
+    'sector-explorer': ('Payroll Jobs by Sector', None,
+                        'Pick a month and a measure to compare sectors, and any sectors to follow that measure '
+                        'over time.', None),
+    # only offered once a release has been recorded (ingest.py or vintages.py)
+    'revisions': ('Revisions to Payroll Jobs and Real GDP', None,
+                  'Payroll jobs and GDP are revised for months after they are first published. The solid line is the '
+                  'latest release; pick earlier releases, or each observation as first reported, to see how the '
+                  'numbers changed.', None),
+}
+
+stateClaimsTab = 'state-claims'
+defaultStateAggregation = 'sum'
+sectorExplorerTab = 'sector-explorer'
+revisionsTab = 'revisions'
+defaultRevisionSeries = 'PAYEMS_1M'
+defaultVintages = ['first']
+defaultSectorMetric = '1M'
+defaultSectorHistory = [sectors.labels.index('Leisure & Hospitality'), sectors.labels.index('Retail Trade'),
+                        sectors.labels.index('Manufacturing')]
+
+# time-series tabs are downsampled for the full view and re-sent at full resolution for the zoomed window
+zoomableTabs = [tab for tab, (_, figId, _, _) in tabContent.items() if figId not in ('fig7', 'fig8', None)]
+
+
+################ VIEW TOGGLES #################
+# Controls under a graph that only change how the figure already in the browser is shown. They are applied by the
+# clientside assets/views.js and recorded in the '<graph>-view' store; when the server does send a new figure (a
+# zoom that needs more points, a new state selection), it is sent with that view applied.
+
+rangePresets = [('1Y', '1'), ('5Y', '5'), ('Max', 'max')]
+logScaleCharts = {'fig1', 'fig2', 'fig3', 'fig4', 'fig10', 'fig11'}
+traceToggleCharts = {'fig1', 'fig4'}
+inlineStyle = {'display': 'inline-block', 'margin-right': '15px'}
+
+
+# kind -> (component id suffix, default value)
+viewControls = {'range': ('-range', 'max'), 'scale': ('-scale', 'linear'), 'perCapita': ('-per-capita', 'total'),
+                'traces': ('-traces', None)}
+
+
+def viewKinds(tab):
+    figId = tabContent[tab][1]
+    kinds = ['range']
+    if figId in logScaleCharts or tab == stateClaimsTab:
+        kinds.append('scale')
+    if tab == stateClaimsTab:
+        kinds.append('perCapita')
+    if figId in traceToggleCharts:
+        kinds.append('traces')
+    return kinds
+
+
+def viewGraphId(tab):
+    return 'state-claims-graph' if tab == stateClaimsTab else tab
+
+
+def defaultView(tab):
+    view = {kind: viewControls[kind][1] for kind in viewKinds(tab)}
+    if 'traces' in view:
+        view['traces'] = list(range(len(figures.charts[tabContent[tab][1]].traces)))
+    return view
+
+
+def renderViewControls(tab):
+    graphId = viewGraphId(tab)
+    view = defaultView(tab)
+    controls = [dcc.Store(id=graphId + '-view', data=view)]
+    for kind in viewKinds(tab):
+        componentId = graphId + viewControls[kind][0]
+        if kind == 'range':
+            options = [{'label': label, 'value': value} for label, value in rangePresets]
+        elif kind == 'scale':
+            options = [{'label': 'Linear', 'value': 'linear'}, {'label': 'Log', 'value': 'log'}]
+        elif kind == 'perCapita':
+            options = [{'label': 'Total', 'value': 'total'}, {'label': 'Per 100k residents', 'value': 'perCapita'}]
+        else:
+            options = [{'label': trace.name, 'value': i}
+                       for i, trace in enumerate(figures.charts[tabContent[tab][1]].traces)]
+            controls.append(dcc.Checklist(id=componentId, value=view[kind], options=options,
+                                          labelStyle=inlineStyle, style=inlineStyle))
+            continue
+        controls.append(dcc.RadioItems(id=componentId, value=view[kind], options=options, labelStyle=inlineStyle,
+                                       style=inlineStyle))
+    return html.Div(controls)
+
+
+# The view as the server applies it to a figure it sends (the range comes with the figure itself)
+def withView(figure, view):
+    if not view:
+        return figure
+    layout = dict(figure['layout'])
+    data = figure['data']
+    if view.get('scale') == 'log':
+        layout['yaxis'] = dict(layout.get('yaxis', {}), type='log')
+    if 'perCapita' in view:
+        data = [dict(trace, visible=trace['meta'] == view['perCapita']) if 'meta' in trace else trace
+                for trace in data]
+        if view['perCapita'] == 'perCapita':
+            layout['yaxis'] = dict(layout.get('yaxis', {}), title=yaxisPerCapitaTitle)
+    if 'traces' in view:
+        data = [dict(trace, visible=True if i in view['traces'] else 'legendonly') for i, trace in enumerate(data)]
+    return {'data': data, 'layout': layout}
+
+
+def registerViewCallback(app, tab):
+    graphId = viewGraphId(tab)
+    kinds = viewKinds(tab)
+    app.clientside_callback(
+        'function () { var values = Array.prototype.slice.call(arguments); '
+        'return window.dash_clientside.indicator.applyView(%s, %s, values.slice(0, -1), values[values.length - 1]); }'
+        % (json.dumps(graphId), json.dumps(kinds)),
+        Output(graphId + '-view', 'data'),
+        [Input(graphId + viewControls[kind][0], 'value') for kind in kinds],
+        [State(graphId + '-view', 'data')],
+        prevent_initial_call=True)
+
+
+def stateClaimsFigure(snap, codes, how, dateRange=store.fullRange, relayoutData=None, width=None):
+    figure = figures.getStateClaimsFigure(snap, codes, how, dateRange)
+    return encoding.compactFigure(downsample.downsampleFigure(figure, downsample.xRange(relayoutData), width))
+
+
+def renderStateClaims(snap, dateRange):
+    title, _, text, _ = tabContent[stateClaimsTab]
+    if snap.stateClaims is None:
+        return [html.H6(title), html.P('No state claims have been ingested yet.')]
+    return [html.H6(title),
+            dcc.Dropdown(id='state-claims-states', multi=True, placeholder='All states',
+                         options=[{'label': name, 'value': code} for code, name, _ in claims.states
+                                  if code in snap.stateClaims.rows]),
+            dcc.RadioItems(id='state-claims-how', value=defaultStateAggregation,
+                           options=[{'label': label, 'value': how} for how, label in claims.aggregations.items()],
+                           labelStyle=inlineStyle),
+            dcc.Graph(id='state-claims-graph', figure=stateClaimsFigure(snap, [], defaultStateAggregation, dateRange)),
+            renderViewControls(stateClaimsTab),
+            html.P(text)]
+
+
+def renderSectorExplorer(snap, dateRange):
+    title, _, text, _ = tabContent[sectorExplorerTab]
+    months = snap.sectors.monthLabels()
+    return [html.H6(title),
+            html.Div([
+                dcc.Dropdown(id='sector-month', value=months[-1], clearable=False,
+                             options=[{'label': month, 'value': month} for month in months[::-1]],
+                             style={'width': '150px', 'display': 'inline-block', 'margin-right': '15px'}),
+                dcc.Dropdown(id='sector-metric', value=defaultSectorMetric, clearable=False,
+                             options=[{'label': label, 'value': metric}
+                                      for metric, label in sectors.metricLabels.items()],
+                             style={'width': '220px', 'display': 'inline-block', 'margin-right': '15px'}),
+                dcc.RadioItems(id='sector-sort', value='value',
+                               options=[{'label': 'Largest first', 'value': 'value'},
+                                        {'label': 'By sector', 'value': 'sector'}],
+                               labelStyle={'display': 'inline-block', 'margin-right': '15px'},
+                               style={'display': 'inline-block'}),
+            ]),
+            dcc.Graph(id='sector-bars', config={'displayModeBar': False}, figure=encoding.compactFigure(
+                figures.getSectorBars(snap, defaultSectorMetric, months[-1], 'value'))),
+            dcc.Dropdown(id='sector-history-sectors', multi=True, value=defaultSectorHistory,
+                         options=[{'label': label, 'value': row} for row, label in enumerate(sectors.labels)]),
+            dcc.Graph(id='sector-history', figure=encoding.compactFigure(
+                figures.getSectorHistory(snap, defaultSectorMetric, defaultSectorHistory, dateRange))),
+            html.P(text)]
+
+
+# 'first' and every release but the latest (always drawn), newest first
+def vintageOptions(snap, seriesId):
+    releases = [str(day) for day in snap.vintages.releases(seriesId)[:-1][::-1]]
+    return [{'label': figures.vintageName(day), 'value': day} for day in ['first'] + releases]
+
+
+def revisionsFigure(snap, seriesId, days, dateRange=store.fullRange):
+    return encoding.compactFigure(figures.getVintageFigure(snap, seriesId, days, dateRange))
+
+
+def renderRevisions(snap, dateRange):
+    title, _, text, _ = tabContent[revisionsTab]
+    if snap.vintages is None:
+        return [html.H6(title), html.P('No releases have been recorded yet.')]
+    seriesId = defaultRevisionSeries if defaultRevisionSeries in snap.vintages else next(iter(snap.vintages))
+    return [html.H6(title),
+            html.Div([
+                dcc.Dropdown(id='revisions-series', value=seriesId, clearable=False,
+                             options=[{'label': vintages.labels[tracked], 'value': tracked}
+                                      for tracked in snap.vintages],
+                             style={'width': '320px', 'display': 'inline-block', 'margin-right': '15px'}),
+                dcc.Dropdown(id='revisions-vintages', multi=True, value=defaultVintages,
+                             options=vintageOptions(snap, seriesId), placeholder='Latest release only',
+                             style={'width': '420px', 'display': 'inline-block', 'vertical-align': 'top'}),
             ]),
+            dcc.Graph(id='revisions-graph', figure=revisionsFigure(snap, seriesId, defaultVintages, dateRange)),
+            html.P(text)]
 
-            dcc.Tab(label='Quarterly Real GDP', children=[
-                html.H6('Real GDP per Quarter (in trillions)'),
-                dcc.Graph(
-                    id='real-gdp',
-                    figure=fig10
-                ),
-                html.P(' ')
-            ])
 
-        ], colors=tabColors)
+# tab value -> function(snap, dateRange) for tabs with their own controls instead of one figure
+customTabs = {stateClaimsTab: renderStateClaims, sectorExplorerTab: renderSectorExplorer,
+              revisionsTab: renderRevisions}
 
-    ], style=tabsStyle),
 
-    html.Br(),
+def tabFigure(tab, snap, dateRange=store.fullRange, relayoutData=None, width=None):
+    figure = figures.getFigure(tabContent[tab][1], snap, dateRange)
+    if tab in zoomableTabs:
+        figure = downsample.downsampleFigure(figure, downsample.xRange(relayoutData), width)
+    return encoding.compactFigure(figure)
+
+
+def renderTab(tab, snap=None, dateRange=store.fullRange):
+    snap = snap or snapshot.get()
+    if tab in customTabs:
+        return customTabs[tab](snap, dateRange)
+    title, figId, text, config = tabContent[tab]
+    return [html.H6(title.format(**snap.kpis)),
+            dcc.Graph(id=tab, figure=tabFigure(tab, snap, dateRange), config=config or {})] + \
+        ([renderViewControls(tab)] if tab in zoomableTabs else []) + \
+        [html.P(text.format(**snap.kpis))]
+
+
+def applyDatePreset(preset):
+    if preset not in [value for _, value in datePresets]:
+        raise PreventUpdate
+    return presetRange(preset, snapshot.get())
+
+
+def dateRangeChanged():
+    return any(trigger['prop_id'] in dateRangeProps for trigger in dash.callback_context.triggered)
+
+
+# A new date range re-sends the figure sliced to it. A zoom only needs the server when the browser was sent fewer
+# points than the figure has.
+def zoomTab(tab, relayoutData, start, end, width, view):
+    snap = snapshot.get()
+    dateRange = selectedRange(start, end)
+    if dateRangeChanged():
+        return withView(tabFigure(tab, snap, dateRange), view)
+    if not downsample.isZoomEvent(relayoutData) or \
+            not downsample.isReducible(figures.getFigure(tabContent[tab][1], snap, dateRange), width):
+        raise PreventUpdate
+    return withView(tabFigure(tab, snap, dateRange, relayoutData, width), view)
+
+
+# A new selection is a cached reduction of the state x week array; zooming re-sends the window at full resolution
+def updateStateClaims(codes, how, relayoutData, start, end, width, view):
+    snap = snapshot.get()
+    if snap.stateClaims is None or how not in claims.aggregations:
+        raise PreventUpdate
+    dateRange = selectedRange(start, end)
+    triggered = [trigger['prop_id'] for trigger in dash.callback_context.triggered]
+    if triggered == ['state-claims-graph.relayoutData'] and (
+            not downsample.isZoomEvent(relayoutData) or
+            not downsample.isReducible(figures.getStateClaimsFigure(snap, codes, how, dateRange), width)):
+        raise PreventUpdate
+    if triggered != ['state-claims-graph.relayoutData']:
+        relayoutData = None
+    return withView(stateClaimsFigure(snap, codes, how, dateRange, relayoutData, width), view)
+
+
+################ MEMOIZED CALLBACKS #################
+# Callbacks whose response only depends on their input values and the data version. Their serialized responses are
+# kept in the payload cache (bounded by entries and bytes) and answered before Dash dispatches the request, so a
+# selection any user already made is neither recomputed nor re-serialized.
+
+# 'id.prop' -> (component id, property, function(snap, *input values), inputs); registered with Dash by createApp
+memoizedCallbacks = {}
+
+
+def memoizedCallback(outputId, outputProp, inputs):
+    def register(function):
+        memoizedCallbacks[outputId + '.' + outputProp] = (outputId, outputProp, function, inputs)
+        return function
+    return register
+
+
+def hashable(value):
+    return tuple(hashable(item) for item in value) if isinstance(value, list) else value
+
+
+def callbackPayload(output, values, snap):
+    outputId, outputProp, function, _ = memoizedCallbacks[output]
+    return payloads.getPayload(('callback', output, hashable(values), snap.version),
+                               lambda: {'multi': True, 'response': {outputId: {outputProp: function(snap, *values)}}})
+
+
+@memoizedCallback('sector-bars', 'figure',
+                  [Input('sector-month', 'value'), Input('sector-metric', 'value'), Input('sector-sort', 'value')])
+def sectorBars(snap, month, metric, sort):
+    if month not in snap.sectors.monthLabels() or metric not in sectors.metrics or sort not in ('value', 'sector'):
+        raise PreventUpdate
+    return encoding.compactFigure(figures.getSectorBars(snap, metric, month, sort))
 
-    # SOURCES
-    html.Div([
-        html.P([
-            html.A('Developed by Cansu Freeman', href='https://cansufreeman.com',
-                   style={'color': highlightColor})
-        ]),
-        html.P('Sources: Bureau of Labor Statistics and Federal Reserve Economic Data'),
-    ], style={'width': '100%', 'text-align': 'right'}),
 
-    html.Br()
+@memoizedCallback('sector-history', 'figure',
+                  [Input('sector-metric', 'value'), Input('sector-history-sectors', 'value')] + dateRangeInputs)
+def sectorHistory(snap, metric, rows, start, end):
+    rows = [row for row in rows or () if isinstance(row, int) and 0 <= row < len(sectors.labels)]
+    if metric not in sectors.metrics:
+        raise PreventUpdate
+    return encoding.compactFigure(figures.getSectorHistory(snap, metric, rows, selectedRange(start, end)))
 
-], style={
-    'backgroundColor': backgroundColor,
-    'padding': '10px',
-    'color': textColor,
-    'font-family': 'Futura, Trebuchet MS, Verdana, Sans-serif',
-    'font-weight': ''})
+
+@memoizedCallback('revisions-vintages', 'options', [Input('revisions-series', 'value')])
+def revisionOptions(snap, seriesId):
+    if snap.vintages is None or seriesId not in snap.vintages:
+        raise PreventUpdate
+    return vintageOptions(snap, seriesId)
+
+
+@memoizedCallback('revisions-graph', 'figure',
+                  [Input('revisions-series', 'value'), Input('revisions-vintages', 'value')] + dateRangeInputs)
+def revisionsGraph(snap, seriesId, days, start, end):
+    if snap.vintages is None or seriesId not in snap.vintages:
+        raise PreventUpdate
+    known = {option['value'] for option in vintageOptions(snap, seriesId)}
+    days = [day for day in days or () if day in known]
+    return revisionsFigure(snap, seriesId, days, selectedRange(start, end))
+
+
+################ PRE-SERIALIZED PAYLOADS #################
+# The layout and tab contents only change with the data, so their JSON is built once per data version and the
+# hot Dash routes are answered straight from those bytes (with an ETag, so repeat visits get a 304)
+
+# Dash's routes under its default '/' prefix
+layoutPath = '/_dash-layout'
+callbackPath = '/_dash-update-component'
+tabOutputSuffix = '-tab-content.children'
+
+
+def layoutPayload(snap):
+    return payloads.getPayload(('layout', snap.version), lambda: buildLayout(snap))
+
+
+def tabPayload(section, tab, snap, dateRange=store.fullRange):
+    return payloads.getPayload(('tab', section, tab, dateRange, snap.version),
+                               lambda: {'multi': True,
+                                        'response': {section + '-tab-content': {
+                                            'children': renderTab(tab, snap, dateRange)}}})
+
+
+def figurePayload(figId, snap):
+    return payloads.getPayload(('figure', figId, snap.version),
+                               lambda: encoding.compactFigure(figures.getFigure(figId, snap)))
+
+
+def servePreserialized():
+    if flask.request.path == layoutPath:
+        return payloads.respond(layoutPayload(snapshot.get()))
+    if flask.request.path == callbackPath:
+        body = flask.request.get_json(silent=True) or {}
+        output = body.get('output', '')
+        inputs = body.get('inputs') or [{}]
+        if output.endswith(tabOutputSuffix) and inputs[0].get('value') in tabContent:
+            section = output[:-len(tabOutputSuffix)]
+            dateRange = selectedRange(*[item.get('value') for item in body.get('state') or []][:2])
+            return payloads.respond(tabPayload(section, inputs[0]['value'], snapshot.get(), dateRange),
+                                    conditional=False)
+        if output in memoizedCallbacks:
+            try:
+                payload = callbackPayload(output, [item.get('value') for item in inputs], snapshot.get())
+            except PreventUpdate:
+                return flask.Response(status=204)
+            return payloads.respond(payload, conditional=False)
+    return None
+
+
+def serveFigure(figId):
+    if figId not in figures.charts:
+        flask.abort(404)
+    return payloads.respond(figurePayload(figId, snapshot.get()))
+
+
+################ BACKGROUND REFRESH #################
+# A new snapshot gets its layout and default tabs (for every date preset) serialized before it is swapped in
+
+
+def warmSnapshot(snap):
+    with metrics.timed('warm'):
+        layoutPayload(snap)
+        for _, preset in datePresets:
+            for section, tab in defaultTabs.items():
+                tabPayload(section, tab, snap, presetRange(preset, snap))
+
+
+# Health check for the platform/load balancer: 503 until this process has a warmed snapshot
+def healthz():
+    snap = snapshot.current
+    if snap is None:
+        return flask.jsonify({'ready': False}), 503
+    return flask.jsonify({'ready': True, 'version': snap.version, 'age': round(time.time() - snap.loadedAt, 1),
+                          'pid': os.getpid(), 'memory': snapshot.memoryUsage()})
 
 # next add PUA benefits
 
 
+################ APP FACTORY #################
+
+
+# A tab is rendered for the date range picked at the time; a new range only replaces the figure of the tab on show
+# (zoomTab), so its controls keep their values
+def registerCallbacks(app):
+    for section in ['unemployment', 'jobs', 'gdp']:
+        app.callback(Output(section + '-tab-content', 'children'),
+                     [Input(section + '-tabs', 'value')], dateRangeStates)(
+            lambda tab, start, end: renderTab(tab, None, selectedRange(start, end)))
+
+    app.callback([Output('date-range', 'start_date'), Output('date-range', 'end_date')],
+                 [Input('date-range-preset', 'value')], prevent_initial_call=True)(applyDatePreset)
+
+    for tab in zoomableTabs:
+        app.callback(Output(tab, 'figure'),
+                     [Input(tab, 'relayoutData')] + dateRangeInputs,
+                     [State('viewport-width', 'data'), State(tab + '-view', 'data')])(
+            lambda relayoutData, start, end, width, view, tab=tab: zoomTab(tab, relayoutData, start, end, width,
+                                                                           view))
+        registerViewCallback(app, tab)
+
+    app.callback(Output('state-claims-graph', 'figure'),
+                 [Input('state-claims-states', 'value'), Input('state-claims-how', 'value'),
+                  Input('state-claims-graph', 'relayoutData')] + dateRangeInputs,
+                 [State('viewport-width', 'data'), State('state-claims-graph-view', 'data')],
+                 prevent_initial_call=True)(updateStateClaims)
+    registerViewCallback(app, stateClaimsTab)
+
+    for outputId, outputProp, function, inputs in memoizedCallbacks.values():
+        app.callback(Output(outputId, outputProp), inputs, prevent_initial_call=True)(
+            lambda *values, function=function: function(snapshot.get(), *values))
+
+    app.clientside_callback('function(id) { return window.innerWidth; }',
+                            Output('viewport-width', 'data'),
+                            [Input('viewport-width', 'id')])
+
+
+def createApp():
+    app = dash.Dash(__name__, external_stylesheets=external_stylesheets, compress=False)
+    server = app.server
+    app.title = 'The Indicator App'  # tab on top of browser
+    app.config.suppress_callback_exceptions = True  # graphs only exist once their tab is rendered
+    metrics.init(server)  # /metrics, request timings; registered first so it measures the other hooks
+    server.register_blueprint(api.blueprint)  # /api/series JSON/CSV/npy endpoints
+    compression.init(server)  # brotli/gzip, see compression.py
+
+    app.layout = serveLayout
+    registerCallbacks(app)
+    metrics.callbackOutputs.update(app.callback_map)
+    server.before_request(servePreserialized)
+    server.add_url_rule('/_figures/<figId>.json', 'serveFigure', serveFigure)
+    server.add_url_rule('/healthz', 'healthz', healthz)
+
+    if warmSnapshot not in snapshot.warmers:
+        snapshot.warmers.append(warmSnapshot)
+    if not snapshot.schedulerDeferred:
+        snapshot.startScheduler()
+    return app
+
+
+app = createApp()
+server = app.server
+
 if __name__ == '__main__':
     app.run_server(debug=True)
@@ -0,0 +1,93 @@
+// VIEW TOGGLES
+// Scale, date-range presets, trace toggles and total/per-capita switches are applied in the browser to the figure
+// that is already drawn, so they never cost a request. Only a range that needs more points than were sent (see
+// app.zoomTab) goes back to the server, through the graph's relayoutData.
+
+(function () {
+    var dayMs = 86400000;
+
+    function isoDay(ms) {
+        return new Date(ms).toISOString().slice(0, 10);
+    }
+
+    // Last date on the x axis of the visible traces, in ms; traces may carry x values or x0 + dx
+    function lastDate(gd) {
+        var last = null;
+        (gd._fullData || []).forEach(function (trace) {
+            if (trace.visible !== true) {
+                return;
+            }
+            var end;
+            if (trace.x && trace.x.length) {
+                end = new Date(trace.x[trace.x.length - 1]).getTime();
+            } else if (trace.x0 !== undefined && trace._length) {
+                end = new Date(trace.x0).getTime() + trace.dx * (trace._length - 1);
+            }
+            if (end !== undefined && !isNaN(end) && (last === null || end > last)) {
+                last = end;
+            }
+        });
+        return last;
+    }
+
+    function rangeUpdate(gd, preset) {
+        if (preset === 'max') {
+            return {'xaxis.autorange': true};
+        }
+        var end = lastDate(gd);
+        if (end === null) {
+            return {};
+        }
+        var years = parseInt(preset, 10);
+        return {'xaxis.range': [isoDay(end - years * 365.25 * dayMs), isoDay(end + 4 * dayMs)]};
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        indicator: {
+            // controls names the view setting each value is for; previous is the view last applied, so only the
+            // settings that changed are touched (a new scale keeps the user's zoom)
+            applyView: function (graphId, controls, values, previous) {
+                var view = {};
+                controls.forEach(function (kind, i) {
+                    view[kind] = values[i];
+                });
+                previous = previous || {};
+                var graph = document.getElementById(graphId);
+                var gd = graph && graph.querySelector('.js-plotly-plot');
+                if (!gd || !gd.data) {
+                    return view;
+                }
+                function changed(kind) {
+                    return kind in view && JSON.stringify(view[kind]) !== JSON.stringify(previous[kind]);
+                }
+
+                var layout = {};
+                var visible = null;
+                if (changed('scale')) {
+                    layout['yaxis.type'] = view.scale;
+                }
+                if (changed('perCapita')) {
+                    visible = gd.data.map(function (trace) {
+                        return trace.meta === undefined ? trace.visible : trace.meta === view.perCapita;
+                    });
+                    layout['yaxis.title.text'] = view.perCapita === 'perCapita' ? 'per 100k residents' : '';
+                }
+                if (changed('traces')) {
+                    visible = gd.data.map(function (trace, i) {
+                        return view.traces.indexOf(i) >= 0 ? true : 'legendonly';
+                    });
+                }
+                if (visible !== null) {
+                    Plotly.restyle(gd, {visible: visible});
+                }
+                if (changed('range')) {
+                    Object.assign(layout, rangeUpdate(gd, view.range));
+                }
+                if (Object.keys(layout).length) {
+                    Plotly.relayout(gd, layout);
+                }
+                return view;
+            }
+        }
+    });
+})();
@@ -0,0 +1,349 @@
+import argparse
+import http.client
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# BENCHMARKS
+# Runs offline against the bundled data/ and prints one JSON document, so runs can be diffed for regressions:
+#   python benchmark.py [--requests N] [--concurrency C] [--output results.json]
+# Cold start and request latency run in child processes; the build stages are timed in this one.
+#   python benchmark.py --check-cold-start
+# only measures cold start and the import profile, and exits 1 when a fresh process takes longer than the budget
+# to be ready to serve, or `import app` loads a module that should only be imported on first use.
+
+baseDir = os.path.dirname(os.path.abspath(__file__))
+
+# no refresh thread, and never the GitHub copy of the data
+benchmarkEnv = dict(os.environ, INDICATOR_REFRESH_SECONDS='0', INDICATOR_REMOTE_DATA='0')
+os.environ.update(INDICATOR_REFRESH_SECONDS='0', INDICATOR_REMOTE_DATA='0')
+
+# Milliseconds from starting a process to having the data loaded and the default tabs serialized, with an empty parse
+# cache (a restarted dyno); dyno restarts and autoscaling wait on this
+coldStartBudgetMs = float(os.environ.get('INDICATOR_COLD_START_BUDGET_MS', 4000))
+
+# modules app.py must not import at import time (they are imported on first use, or not at all)
+deferredModules = ['pandas', 'plotly.express', 'plotly.subplots', 'plotly.offline', 'matplotlib', 'IPython']
+
+coldStartScript = '''
+import json, resource, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+import snapshot
+snapshot.get()
+print(json.dumps({'importSeconds': imported - start, 'readySeconds': time.perf_counter() - start,
+                  'peakRssBytes': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024}))
+'''
+
+serverScript = '''
+import logging
+from werkzeug.serving import make_server
+import app
+logging.getLogger('werkzeug').setLevel(logging.ERROR)
+server = make_server('127.0.0.1', 0, app.server, threaded=True)
+print(server.server_port, flush=True)
+server.serve_forever()
+'''
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def milliseconds(seconds):
+    return round(seconds * 1000, 3)
+
+
+def peakRss(pid='self'):
+    try:
+        with open('/proc/%s/status' % pid) as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def runChild(script, env):
+    output = subprocess.run([sys.executable, '-c', script], cwd=baseDir, env=env, check=True,
+                            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, universal_newlines=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+# `import app` and the first snapshot in a fresh interpreter, with an empty parse cache and with the cache the first
+# run left behind
+def coldStart():
+    results = {}
+    with tempfile.TemporaryDirectory() as cacheDir:
+        env = dict(benchmarkEnv, INDICATOR_CACHE_DIR=cacheDir)
+        for name in ['emptyCache', 'warmCache']:
+            child, seconds = timed(runChild, coldStartScript, env)
+            results[name] = {'processMs': milliseconds(seconds), 'importMs': milliseconds(child['importSeconds']),
+                             'readyMs': milliseconds(child['readySeconds']), 'peakRssBytes': child['peakRssBytes']}
+    return results
+
+
+# `python -X importtime -c "import app"`: the slowest modules by their own and by cumulative import time, and
+# any deferredModules that were imported
+def importProfile(top=15):
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'], cwd=baseDir, env=benchmarkEnv,
+                            check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                            universal_newlines=True).stderr
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        modules.append((name.strip(), int(own), int(cumulative)))
+    loaded = {name for name, _, _ in modules}
+    return {'totalMs': milliseconds(max(cumulative for _, _, cumulative in modules) / 1e6),
+            'modules': len(modules),
+            'bySelf': {name: milliseconds(own / 1e6) for name, own, _ in sorted(modules, key=lambda m: -m[1])[:top]},
+            'byCumulative': {name: milliseconds(cumulative / 1e6)
+                             for name, _, cumulative in sorted(modules, key=lambda m: -m[2])[:top]},
+            'deferredImported': [name for name in deferredModules if name in loaded]}
+
+
+# Problems with a cold start, for --check-cold-start; none means it is within budget
+def coldStartProblems(start, profile):
+    problems = []
+    if start['emptyCache']['readyMs'] > coldStartBudgetMs:
+        problems.append('ready after %.0f ms, over the %.0f ms budget' % (start['emptyCache']['readyMs'],
+                                                                          coldStartBudgetMs))
+    for name in profile['deferredImported']:
+        problems.append('import app loads %s, which should be imported on first use' % name)
+    return problems
+
+
+def buildStages():
+    import encoding
+    import loader
+    import figures
+    import payloads
+    import pipeline
+    import snapshot
+    import vintages
+    from claims import StateClaims
+    from rolling import RollingEngine
+    from sectors import SectorEngine
+    from store import SeriesStore
+
+    stages = {}
+    cacheDir = loader.cacheDir
+    with tempfile.TemporaryDirectory() as loader.cacheDir:
+        _, seconds = timed(loader.loadFrames)
+        stages['loadFramesParse'] = milliseconds(seconds)
+        (frames, version), seconds = timed(loader.loadFrames)
+        stages['loadFramesCached'] = milliseconds(seconds)
+    loader.cacheDir = cacheDir
+    # None unless `python pipeline.py` ran on the current files
+    _, seconds = timed(pipeline.loadBuild)
+    stages['loadBuild'] = milliseconds(seconds)
+    store, seconds = timed(SeriesStore.fromFrames, frames)
+    stages['seriesStore'] = milliseconds(seconds)
+    rolling, seconds = timed(RollingEngine.fromStore, store)
+    stages['rollingBackfill'] = milliseconds(seconds)
+    store = store.withSeries(rolling.series(store))
+    sectors, seconds = timed(SectorEngine.fromFrames, frames)
+    stages['sectorEngine'] = milliseconds(seconds)
+    stateClaims, seconds = timed(StateClaims.fromFrames, frames)
+    stages['stateClaims'] = milliseconds(seconds)
+    vintageStore, seconds = timed(vintages.VintageStore.load)
+    stages['vintages'] = milliseconds(seconds)
+    kpis, seconds = timed(snapshot.computeKpis, store, sectors)
+    stages['kpis'] = milliseconds(seconds)
+
+    snap = snapshot.Snapshot(version, None, store, sectors, stateClaims, rolling, vintageStore, kpis, time.time())
+    figureStages = {}
+    for figId, chart in figures.charts.items():
+        figure, seconds = timed(figures.buildChart, snap, chart)
+        points = sum(len(trace['x']) for trace in figure['data'])
+        compact, compactSeconds = timed(encoding.compactFigure, figure)
+        # bytes with per-point ISO dates and full float text, against the wire form the browser gets
+        figureStages[figId] = {'buildMs': milliseconds(seconds), 'points': points,
+                               'encodeMs': milliseconds(compactSeconds),
+                               'plainBytes': len(payloads.serialize(figure).body),
+                               'bytes': len(payloads.serialize(compact).body),
+                               'traceTypes': [trace['type'] for trace in compact['data']]}
+    return version, stages, figureStages
+
+
+def layoutSerialization():
+    import app
+    import payloads
+    import snapshot
+
+    snap = snapshot.get()
+    layout, buildSeconds = timed(app.buildLayout, snap)
+    payload, serializeSeconds = timed(payloads.serialize, layout)
+    tabs = {}
+    for section, tab in app.defaultTabs.items():
+        content, seconds = timed(app.renderTab, tab, snap)
+        body = payloads.serialize(content).body
+        tabs[tab] = {'buildMs': milliseconds(seconds), 'bytes': len(body)}
+    return {'buildMs': milliseconds(buildSeconds), 'serializeMs': milliseconds(serializeSeconds),
+            'bytes': len(payload.body)}, tabs
+
+
+def dateRange(start=None, end=None):
+    return [{'id': 'date-range', 'property': 'start_date', 'value': start},
+            {'id': 'date-range', 'property': 'end_date', 'value': end}]
+
+
+def tabCallback(section, tab):
+    return {'output': section + '-tab-content.children',
+            'outputs': {'id': section + '-tab-content', 'property': 'children'},
+            'inputs': [{'id': section + '-tabs', 'property': 'value', 'value': tab}],
+            'state': dateRange(),
+            'changedPropIds': [section + '-tabs.value']}
+
+
+# A zoom is only answered when the figure has more points than `width` pixels can show (downsample.isReducible), so
+# the width is small enough for the historical claims (778 weeks) to be reduced rather than the zoom skipped
+def zoomCallback(tab, relayoutData, width=320):
+    return {'output': tab + '.figure',
+            'outputs': {'id': tab, 'property': 'figure'},
+            'inputs': [{'id': tab, 'property': 'relayoutData', 'value': relayoutData}] + dateRange(),
+            'state': [{'id': 'viewport-width', 'property': 'data', 'value': width},
+                      {'id': tab + '-view', 'property': 'data', 'value': None}],
+            'changedPropIds': [tab + '.relayoutData']}
+
+
+# The figure of a tab re-scoped to a global date range
+def rangeCallback(tab, start):
+    body = zoomCallback(tab, None)
+    body['inputs'] = [{'id': tab, 'property': 'relayoutData', 'value': None}] + dateRange(start)
+    body['changedPropIds'] = ['date-range.start_date']
+    return body
+
+
+# name -> (method, path, JSON body)
+endpoints = {
+    'index': ('GET', '/', None),
+    'layout': ('GET', '/_dash-layout', None),
+    'tabCallback': ('POST', '/_dash-update-component', tabCallback('jobs', 'monthly-jobs-change')),
+    # a window re-sent at full resolution, and the full view reduced with LTTB
+    'zoomCallback': ('POST', '/_dash-update-component',
+                     zoomCallback('historical-initial-claims', {'xaxis.range[0]': '2008-01-01',
+                                                                'xaxis.range[1]': '2010-01-01'})),
+    'unzoomCallback': ('POST', '/_dash-update-component',
+                       zoomCallback('historical-initial-claims', {'xaxis.autorange': True})),
+    'rangeCallback': ('POST', '/_dash-update-component', rangeCallback('historical-initial-claims', '2020-01-01')),
+}
+
+
+class Client:
+
+    def __init__(self, port, headers):
+        self.port = port
+        self.headers = headers
+        self.local = threading.local()
+
+    def connection(self):
+        if getattr(self.local, 'connection', None) is None:
+            self.local.connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=30)
+        return self.local.connection
+
+    # (seconds, status, body bytes); the connection is kept alive between requests of one thread
+    def request(self, method, path, body):
+        data = json.dumps(body).encode() if body is not None else None
+        headers = dict(self.headers, **({'Content-Type': 'application/json'} if data else {}))
+        start = time.perf_counter()
+        try:
+            connection = self.connection()
+            connection.request(method, path, data, headers)
+            response = connection.getresponse()
+            size = len(response.read())
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            self.local.connection = None
+            size, status = 0, None
+        return time.perf_counter() - start, status, size
+
+
+def loadTest(requests, concurrency, encoding):
+    process = subprocess.Popen([sys.executable, '-c', serverScript], cwd=baseDir, env=benchmarkEnv,
+                               stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, universal_newlines=True)
+    try:
+        port = int(process.stdout.readline())
+        client = Client(port, {'Accept-Encoding': encoding} if encoding else {})
+        results = {}
+        for name, (method, path, body) in endpoints.items():
+            for _ in range(concurrency):
+                client.request(method, path, body)  # warm caches and connections
+            with ThreadPoolExecutor(concurrency) as pool:
+                start = time.perf_counter()
+                samples = list(pool.map(lambda _: client.request(method, path, body), range(requests)))
+                wall = time.perf_counter() - start
+            latencies = np.array([seconds for seconds, _, _ in samples])
+            results[name] = {'requests': requests, 'concurrency': concurrency,
+                             # a 204 (PreventUpdate) would time a callback that did nothing
+                             'errors': sum(1 for _, status, _ in samples if status != 200),
+                             'p50Ms': milliseconds(np.percentile(latencies, 50)),
+                             'p99Ms': milliseconds(np.percentile(latencies, 99)),
+                             'meanMs': milliseconds(latencies.mean()),
+                             'requestsPerSecond': round(requests / wall, 1),
+                             'bytes': samples[-1][2]}
+        return results, peakRss(process.pid)
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def run(requests, concurrency, encoding):
+    version, stages, figureStages = buildStages()
+    layout, tabs = layoutSerialization()
+    latency, serverPeakRss = loadTest(requests, concurrency, encoding)
+    return {
+        'meta': {'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'), 'python': platform.python_version(),
+                 'platform': platform.platform(), 'dataVersion': version, 'acceptEncoding': encoding},
+        'coldStart': coldStart(),
+        'importProfile': importProfile(),
+        'stages': stages,
+        'figures': figureStages,
+        'layout': layout,
+        'tabs': tabs,
+        'requests': latency,
+        'peakRssBytes': {'benchmark': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+                         'server': serverPeakRss},
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark cold start, build stages and request latency offline')
+    parser.add_argument('--requests', type=int, default=500, help='requests per endpoint (default: 500)')
+    parser.add_argument('--concurrency', type=int, default=8, help='concurrent clients (default: 8)')
+    parser.add_argument('--encoding', default='', help='Accept-Encoding sent by the clients (default: identity)')
+    parser.add_argument('--output', help='write the JSON here instead of stdout')
+    parser.add_argument('--check-cold-start', action='store_true',
+                        help='only measure cold start; exit 1 if it is over INDICATOR_COLD_START_BUDGET_MS')
+    args = parser.parse_args()
+
+    problems = []
+    if args.check_cold_start:
+        results = {'coldStart': coldStart(), 'importProfile': importProfile(), 'budgetMs': coldStartBudgetMs}
+        problems = coldStartProblems(results['coldStart'], results['importProfile'])
+    else:
+        results = run(args.requests, args.concurrency, args.encoding)
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    for problem in problems:
+        print('cold start: ' + problem, file=sys.stderr)
+    sys.exit(1 if problems else 0)
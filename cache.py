@@ -0,0 +1,59 @@
+import threading
+from collections import OrderedDict
+
+
+# Small thread-safe LRU used for figures and other per-data-version artifacts.
+# Keys should include the data version so a refresh never serves a stale entry.
+# With maxBytes, entries are also evicted once their sizes (as measured by sizeOf) add up to more than that;
+# the newest entry is always kept.
+class LRUCache:
+
+    def __init__(self, maxEntries=64, maxBytes=None, sizeOf=None):
+        self.maxEntries = maxEntries
+        self.maxBytes = maxBytes
+        self.sizeOf = sizeOf
+        self.entries = OrderedDict()
+        self.sizes = {}
+        self.nbytes = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        with self.lock:
+            self.nbytes -= self.sizes.pop(key, 0)
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            if self.sizeOf is not None:
+                self.sizes[key] = self.sizeOf(value)
+                self.nbytes += self.sizes[key]
+            while len(self.entries) > self.maxEntries or \
+                    (self.maxBytes is not None and self.nbytes > self.maxBytes and len(self.entries) > 1):
+                evicted, _ = self.entries.popitem(last=False)
+                self.nbytes -= self.sizes.pop(evicted, 0)
+
+    # Returns the cached value for key, calling build() to create it on a miss
+    def getOrBuild(self, key, build):
+        value = self.get(key)
+        if value is None:
+            value = build()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.sizes.clear()
+            self.nbytes = 0
+
+    def __len__(self):
+        return len(self.entries)
@@ -0,0 +1,115 @@
+import numpy as np
+
+from store import Series, rangeBounds
+
+# STATES
+# (code, name, resident population in the 2020 Census). Each state's weekly initial claims (FRED <code>ICLAIMS,
+# not seasonally adjusted) are in data/state-claims/<code>.csv, loaded as loader.optionalSources; see ingest.py.
+states = [
+    ('AL', 'Alabama', 5024279), ('AK', 'Alaska', 733391), ('AZ', 'Arizona', 7151502),
+    ('AR', 'Arkansas', 3011524), ('CA', 'California', 39538223), ('CO', 'Colorado', 5773714),
+    ('CT', 'Connecticut', 3605944), ('DE', 'Delaware', 989948), ('DC', 'District of Columbia', 689545),
+    ('FL', 'Florida', 21538187), ('GA', 'Georgia', 10711908), ('HI', 'Hawaii', 1455271),
+    ('ID', 'Idaho', 1839106), ('IL', 'Illinois', 12812508), ('IN', 'Indiana', 6785528),
+    ('IA', 'Iowa', 3190369), ('KS', 'Kansas', 2937880), ('KY', 'Kentucky', 4505836),
+    ('LA', 'Louisiana', 4657757), ('ME', 'Maine', 1362359), ('MD', 'Maryland', 6177224),
+    ('MA', 'Massachusetts', 7029917), ('MI', 'Michigan', 10077331), ('MN', 'Minnesota', 5706494),
+    ('MS', 'Mississippi', 2961279), ('MO', 'Missouri', 6154913), ('MT', 'Montana', 1084225),
+    ('NE', 'Nebraska', 1961504), ('NV', 'Nevada', 3104614), ('NH', 'New Hampshire', 1377529),
+    ('NJ', 'New Jersey', 9288994), ('NM', 'New Mexico', 2117522), ('NY', 'New York', 20201249),
+    ('NC', 'North Carolina', 10439388), ('ND', 'North Dakota', 779094), ('OH', 'Ohio', 11799448),
+    ('OK', 'Oklahoma', 3959353), ('OR', 'Oregon', 4237256), ('PA', 'Pennsylvania', 13002700),
+    ('RI', 'Rhode Island', 1097379), ('SC', 'South Carolina', 5118425), ('SD', 'South Dakota', 886667),
+    ('TN', 'Tennessee', 6910840), ('TX', 'Texas', 29145505), ('UT', 'Utah', 3271616),
+    ('VT', 'Vermont', 643077), ('VA', 'Virginia', 8631393), ('WA', 'Washington', 7705281),
+    ('WV', 'West Virginia', 1793716), ('WI', 'Wisconsin', 5893718), ('WY', 'Wyoming', 576851),
+]
+
+column = 'Initial Claims'
+
+# per-capita values are claims per this many residents
+perCapitaScale = 100000
+
+# AGGREGATIONS
+# How the selected states are combined into one weekly series: the weekly total, or its 4-week trailing average.
+# Either can be per 100k residents of the states reporting that week.
+aggregations = {'sum': 'Weekly', 'avg4': '4-week average'}
+
+
+def sourceName(code):
+    return 'state_' + code
+
+
+# Trailing mean over `window` observations, skipping missing ones; NaN until a window has any data
+def trailingMean(values, window):
+    present = np.isfinite(values)
+    sums = np.cumsum(np.where(present, values, 0))
+    counts = np.cumsum(present)
+    sums[window:] = sums[window:] - sums[:-window]
+    counts[window:] = counts[window:] - counts[:-window]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(counts > 0, sums / counts, np.nan)
+
+
+# Weekly initial claims of every state with a data file, on one week axis: a state x week float32 array with NaN
+# where a state has no observation. A selection is answered by reducing rows of that array.
+class StateClaims:
+
+    def __init__(self, codes, weeks, counts, populations):
+        self.codes = codes
+        self.weeks = weeks
+        self.counts = counts
+        self.populations = populations
+        self.rows = {code: i for i, code in enumerate(codes)}
+
+    # None when no state file has been ingested yet
+    @classmethod
+    def fromFrames(cls, frames):
+        codes = [code for code, _, _ in states if sourceName(code) in frames]
+        return cls.fromSeries(codes, [frames[sourceName(code)]['Date'].to_numpy().astype('datetime64[D]')
+                                      for code in codes],
+                              [frames[sourceName(code)][column].to_numpy() for code in codes])
+
+    # Each state's dates and claims (states in the order of `states`), as parsed or read from the pipeline's build
+    @classmethod
+    def fromSeries(cls, codes, dates, values):
+        if not codes:
+            return None
+        weeks = np.unique(np.concatenate(dates))
+        counts = np.full((len(codes), len(weeks)), np.nan, dtype=np.float32)
+        for row, (stateDates, stateValues) in enumerate(zip(dates, values)):
+            counts[row, np.searchsorted(weeks, stateDates)] = stateValues
+        populations = {code: population for code, _, population in states}
+        return cls(list(codes), weeks, counts, np.array([populations[code] for code in codes], dtype=np.float64))
+
+    @property
+    def nbytes(self):
+        return self.weeks.nbytes + self.counts.nbytes
+
+    # Row indices of the selected state codes (unknown codes are ignored); an empty selection means every state
+    def selectRows(self, codes):
+        rows = sorted({self.rows[code] for code in codes or () if code in self.rows})
+        return np.array(rows, dtype=np.int64) if rows else np.arange(len(self.codes))
+
+    def bounds(self, start=None, end=None):
+        return rangeBounds(self.weeks, start, end)
+
+    # One weekly series combining the selected states with an aggregation, between start and end (inclusive)
+    def select(self, codes, how='sum', perCapita=False, start=None, end=None):
+        if how not in aggregations:
+            raise ValueError('unknown aggregation %r' % how)
+        rows = self.selectRows(codes)
+        lo, hi = self.bounds(start, end)
+        # avg4 needs the three weeks before the window
+        first = max(lo - 3, 0) if how == 'avg4' else lo
+        counts = self.counts[rows, first:hi]
+        reported = np.isfinite(counts)
+        totals = np.where(reported, counts, 0).sum(axis=0, dtype=np.float64)
+        totals[~reported.any(axis=0)] = np.nan
+        if perCapita:
+            populations = np.where(reported, self.populations[rows, None], 0).sum(axis=0)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                totals = totals / populations * perCapitaScale
+        if how == 'avg4':
+            totals = trailingMean(totals, 4)
+        return Series('ICLAIMS_%s%s' % (how, '_PC' if perCapita else ''), self.weeks[lo:hi], totals[lo - first:], 'W')
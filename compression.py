@@ -0,0 +1,125 @@
+import gzip
+import zlib
+
+import flask
+from flask_compress import Compress
+
+import metrics
+from cache import LRUCache
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+# COMPRESSION
+# Dynamic responses (callbacks, the series API) are compressed per request by Flask-Compress. Bodies that only change
+# with the data or a deploy (the serialized layout and tabs, /assets, the Dash component suites) are compressed once
+# at the highest levels and the encoded bytes are reused. Streamed responses (the series API) are compressed here,
+# chunk by chunk as they are generated: Flask-Compress 1.5 reads a whole response with get_data(), which would
+# buffer the stream, and it skips responses that already carry a Content-Encoding.
+
+encodings = ['br', 'gzip'] if brotli is not None else ['gzip']
+staticPrefixes = ('/assets/', '/_dash-component-suites/')
+compressibleTypes = {'text/css', 'text/html', 'text/plain', 'text/javascript', 'application/javascript',
+                     'application/json', 'image/svg+xml'}
+minSize = 500
+
+staticCache = metrics.registerCache('static', LRUCache(maxEntries=256))
+
+
+def encode(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=11)
+    return gzip.compress(body, compresslevel=9)
+
+
+# Each encoding of a body is its own representation, so it gets its own strong ETag
+def encodedTag(etag, encoding):
+    return etag if encoding is None else '%s-%s' % (etag, encoding)
+
+
+# Best encoding the client accepts, or None for identity
+def negotiate():
+    accepted = flask.request.accept_encodings
+    for encoding in encodings:
+        if accepted[encoding]:
+            return encoding
+    return None
+
+
+def precompressStatic(response):
+    if flask.request.method != 'GET' or response.status_code != 200 or \
+            not flask.request.path.startswith(staticPrefixes) or 'Content-Encoding' in response.headers or \
+            response.mimetype not in compressibleTypes:
+        return response
+    encoding = negotiate()
+    if encoding is None:
+        return response
+
+    # files are versioned by their URL (Dash fingerprints component suites) and validators
+    key = (flask.request.full_path, response.headers.get('ETag'), response.headers.get('Last-Modified'), encoding)
+    body = staticCache.get(key)
+    if body is None:
+        response.direct_passthrough = False
+        data = response.get_data()
+        if len(data) < minSize:
+            return response
+        body = encode(data, encoding)
+        staticCache.put(key, body)
+
+    if hasattr(response.response, 'close'):
+        response.response.close()  # file wrapper of a cache hit that was never read
+    response.direct_passthrough = False
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+# Flask-Compress's default levels
+streamLevels = {'br': 4, 'gzip': 6}
+
+
+def compressChunks(chunks, encoding):
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=streamLevels['br'])
+        compress, finish = compressor.process, compressor.finish
+    else:
+        compressor = zlib.compressobj(streamLevels['gzip'], zlib.DEFLATED, 16 + zlib.MAX_WBITS)  # gzip container
+        compress, finish = compressor.compress, compressor.flush
+    try:
+        for chunk in chunks:
+            data = compress(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+            if data:
+                yield data
+        yield finish()
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+
+def compressStream(response):
+    if not response.is_streamed or response.status_code != 200 or 'Content-Encoding' in response.headers or \
+            response.mimetype not in compressibleTypes:
+        return response
+    encoding = negotiate()
+    if encoding is None:
+        return response
+    response.response = compressChunks(response.response, encoding)
+    response.headers.pop('Content-Length', None)
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag is not None and not weak:
+        response.set_etag(encodedTag(etag, encoding))
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def init(server):
+    server.config.setdefault('COMPRESS_ALGORITHM', encodings)
+    server.config.setdefault('COMPRESS_MIMETYPES', sorted(compressibleTypes))
+    Compress(server)
+    # registered after Flask-Compress, so they run first and Flask-Compress skips the already-encoded bodies
+    server.after_request(precompressStatic)
+    server.after_request(compressStream)
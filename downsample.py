@@ -0,0 +1,137 @@
+import numpy as np
+
+# POINT BUDGET
+# Roughly two points per horizontal pixel is all a line or bar chart can show; width is the browser's width in px
+pointsPerPixel = 2
+defaultWidth = 1200
+
+# A zoomed window is sent at full resolution unless it is this many times over budget
+maxWindowFactor = 20
+
+# per-point trace attributes that have to follow the kept indices
+pointAttributes = ['text', 'hovertext', 'customdata']
+
+
+def pointBudget(width=None):
+    return int((width or defaultWidth) * pointsPerPixel)
+
+
+# Largest-Triangle-Three-Buckets: indices of `threshold` points that keep the visual shape of a line
+def lttb(x, y, threshold):
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    y = np.nan_to_num(y)
+    every = (n - 2) / (threshold - 2)
+    keep = np.empty(threshold, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        nextEnd = min(int((i + 2) * every) + 1, n)
+        avgX = x[end:nextEnd].mean()
+        avgY = y[end:nextEnd].mean()
+        area = np.abs((x[a] - avgX) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avgY - y[a]))
+        a = start + int(np.argmax(area))
+        keep[i + 1] = a
+    return keep
+
+
+# Min/max bucketing for bars: the lowest and highest bar of each bucket, so spikes survive
+def minMax(y, threshold):
+    n = len(y)
+    buckets = threshold // 2
+    if threshold >= n or buckets < 1:
+        return np.arange(n)
+    y = np.where(np.isnan(y), 0, y)
+    edges = np.linspace(0, n, buckets + 1).astype(np.int64)
+    keep = []
+    for start, end in zip(edges[:-1], edges[1:]):
+        if end > start:
+            window = y[start:end]
+            keep.extend(sorted({start + int(np.argmin(window)), start + int(np.argmax(window))}))
+    return np.array(keep, dtype=np.int64)
+
+
+def asMilliseconds(x):
+    return np.asarray(x).astype('datetime64[ms]').astype(np.int64).astype(float)
+
+
+# The x-range the user zoomed to, from a graph's relayoutData; None for the full (autoranged) view
+def xRange(relayoutData):
+    relayoutData = relayoutData or {}
+    if 'xaxis.range[0]' in relayoutData:
+        return relayoutData['xaxis.range[0]'], relayoutData['xaxis.range[1]']
+    if 'xaxis.range' in relayoutData:
+        return tuple(relayoutData['xaxis.range'])
+    return None
+
+
+def isZoomEvent(relayoutData):
+    return xRange(relayoutData) is not None or 'xaxis.autorange' in (relayoutData or {})
+
+
+# Whether a trace has more points than `width` pixels can show, so a zoomed window can reveal detail the full view
+# left out
+def isReducible(figure, width=None):
+    budget = pointBudget(width)
+    return any(len(trace.get('x', ())) > budget for trace in figure['data'] if trace.get('orientation') != 'h')
+
+
+def reduceTrace(trace, window, budget):
+    x = trace.get('x')
+    y = trace.get('y')
+    if x is None or y is None or trace.get('orientation') == 'h' or len(x) <= 2:
+        return trace
+    # plotly ignores the tail of the longer of x and y
+    n = min(len(x), len(y))
+    x = np.asarray(x)[:n]
+    y = np.asarray(y, dtype=float)[:n]
+    xs = asMilliseconds(x)
+
+    lo, hi = 0, len(xs)
+    if window is not None:
+        # one point either side of the window so lines run to the edge of the plot
+        lo = max(int(np.searchsorted(xs, asMilliseconds([window[0]])[0], side='left')) - 1, 0)
+        hi = min(int(np.searchsorted(xs, asMilliseconds([window[1]])[0], side='right')) + 1, len(xs))
+        if hi - lo <= budget * maxWindowFactor:
+            budget = hi - lo
+    if hi - lo <= budget and lo == 0 and hi == len(xs):
+        return trace
+
+    if trace.get('type') == 'bar':
+        keep = lo + minMax(y[lo:hi], budget)
+    else:
+        keep = lo + lttb(xs[lo:hi], y[lo:hi], budget)
+
+    reduced = dict(trace)
+    reduced['x'] = x[keep]
+    reduced['y'] = y[keep]
+    for attribute in pointAttributes:
+        if isinstance(trace.get(attribute), (list, tuple, np.ndarray)) and len(trace[attribute]) == len(xs):
+            reduced[attribute] = np.asarray(trace[attribute])[keep]
+    marker = trace.get('marker')
+    if marker and isinstance(marker.get('color'), (list, tuple, np.ndarray)) and len(marker['color']) == len(xs):
+        reduced['marker'] = dict(marker, color=np.asarray(marker['color'])[keep])
+    return reduced
+
+
+# Returns the figure with every date-axis trace cut to the visible window and reduced to the point budget for
+# `width` pixels. The full view is downsampled; a zoomed window comes back at full resolution.
+def downsampleFigure(figure, window=None, width=None):
+    budget = pointBudget(width)
+    if window is None and all(len(trace.get('x', ())) <= budget for trace in figure['data']):
+        return figure
+
+    # the figure is shared through the figure cache: copy what is changed
+    layout = dict(figure['layout'])
+    xaxis = layout['xaxis'] = dict(layout.get('xaxis', {}))
+    figure = {'data': [reduceTrace(trace, window, budget) for trace in figure['data']], 'layout': layout}
+    if window is None:
+        xaxis['autorange'] = True
+    else:
+        xaxis['range'] = list(window)
+        xaxis['autorange'] = False
+    layout['uirevision'] = 'zoom'
+    return figure
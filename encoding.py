@@ -0,0 +1,104 @@
+import base64
+import functools
+import os
+import re
+
+import numpy as np
+
+# TRACE ENCODING
+# Figures are built with datetime64 x values and numeric arrays; compactFigure turns them into the smallest form the
+# browser's plotly.js reads, right before serialization:
+#  - dates on a regular step (weekly claims) become x0 + dx; other dates become 'YYYY-MM(-DD)' labels
+#  - with plotly.js >= 2.28, numbers are sent as base64 typed arrays (float32 for floats), which the browser uses
+#    without parsing; older plotly.js gets float values rounded to float32 precision as JSON numbers
+#  - line traces with more than glThreshold points are drawn with WebGL (scattergl)
+
+glThreshold = int(os.environ.get('INDICATOR_WEBGL_POINTS', 5000))
+
+
+# The plotly.js the browser draws with: the copy dash_core_components serves to dcc.Graph (and export.py ships), which
+# is upgraded with dcc, not with the Python plotly package
+def plotlyjsPath():
+    import dash_core_components
+    return os.path.join(os.path.dirname(dash_core_components.__file__), 'plotly.min.js')
+
+
+# (major, minor) from the file's license header, or None when it cannot be read; looked up the first time a figure
+# is encoded instead of at import
+@functools.lru_cache(maxsize=None)
+def plotlyjsVersion():
+    try:
+        with open(plotlyjsPath(), 'rb') as f:
+            header = f.read(512).decode('ascii', 'replace')
+    except OSError:
+        return None
+    match = re.search(r'plotly\.js v(\d+)\.(\d+)', header)
+    return (int(match.group(1)), int(match.group(2))) if match else None
+
+
+# Whether that plotly.js reads typed arrays; an unknown version gets plain numbers
+def typedArrays():
+    version = plotlyjsVersion()
+    return version is not None and version >= (2, 28)
+
+
+millisecondsPerDay = 86400000
+typedDtypes = {'i': ('i4', np.int32), 'u': ('i4', np.int32), 'f': ('f4', np.float32), 'b': ('i4', np.int32)}
+
+
+def isDates(values):
+    return isinstance(values, np.ndarray) and values.dtype.kind == 'M'
+
+
+# {'x0', 'dx'} for dates with one constant step, else None
+def regularStep(dates):
+    if len(dates) < 3:
+        return None
+    steps = np.diff(dates.astype('datetime64[D]').astype(np.int64))
+    if steps[0] <= 0 or not (steps == steps[0]).all():
+        return None
+    return {'x0': str(dates[0].astype('datetime64[D]')), 'dx': int(steps[0]) * millisecondsPerDay}
+
+
+def dateLabels(dates):
+    days = dates.astype('datetime64[D]')
+    monthly = (days.astype('datetime64[M]').astype('datetime64[D]') == days).all()
+    return np.datetime_as_string(days, unit='M' if monthly else 'D')
+
+
+def encodeNumbers(values):
+    values = np.asarray(values)
+    if values.dtype.kind not in typedDtypes or values.size == 0:
+        return values
+    if typedArrays():
+        name, dtype = typedDtypes[values.dtype.kind]
+        data = values.astype(np.dtype(dtype).newbyteorder('<'), copy=False)
+        return {'dtype': name, 'bdata': base64.b64encode(data.tobytes()).decode('ascii')}
+    if values.dtype.kind == 'f':
+        # shortest text that round-trips at float32 precision (4.400000095 -> 4.4)
+        return values.astype(np.float32).astype(str).astype(np.float64)
+    return values
+
+
+def compactTrace(trace):
+    compact = dict(trace)
+    x, y = trace.get('x'), trace.get('y')
+    if isDates(x):
+        step = regularStep(x)
+        if step is not None:
+            del compact['x']
+            compact.update(step)
+        else:
+            compact['x'] = dateLabels(x)
+    elif x is not None:
+        compact['x'] = encodeNumbers(x)
+    if y is not None and not isinstance(y, (list, tuple)):
+        compact['y'] = encodeNumbers(y)
+    if trace.get('type') == 'scatter' and x is not None and len(x) > glThreshold:
+        compact['type'] = 'scattergl'
+    return compact
+
+
+# Wire form of a figure built by figures.py (or downsampled from one); the input is not modified
+def compactFigure(figure):
+    return {'data': [compactTrace(trace) for trace in figure['data']], 'layout': figure['layout']}
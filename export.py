@@ -0,0 +1,263 @@
+import argparse
+import gzip
+import hashlib
+import html
+import json
+import os
+import shutil
+
+# STATIC EXPORT
+# Prerenders the dashboard into a directory any static file server or CDN can host, with no Python at request time:
+#   python export.py [--output dist]
+#   index.html                 the page, with every tab's title and text; the only file that is not content-hashed
+#   static/*.<hash>.js|css     plotly.js, the page script and the stylesheet
+#   assets/*.<hash>.png        images
+#   figures/<id>.<hash>.json   one bundle per chart, fetched and drawn the first time its tab is opened
+#   manifest.json              what the next export compares against
+# A chart's bundle is only rebuilt when one of the data files it reads changed (figures.chartSources), or the code
+# that shapes it did (its figures.charts entry, the shared template, exportVersion); hashed files can be cached
+# forever (Cache-Control: immutable). Every file is also written .gz for servers that serve precompressed files.
+# Tabs with server-side controls (state claims, sector explorer) are left out.
+
+baseDir = os.path.dirname(os.path.abspath(__file__))
+os.environ.setdefault('INDICATOR_REFRESH_SECONDS', '0')
+
+hashLength = 12
+
+# bump when the bundle format or encoding.compactFigure changes, so the next export rebuilds every bundle
+exportVersion = 1
+
+pageScript = '''
+(function () {
+  var drawn = {};
+  function draw(panel) {
+    var graph = panel.querySelector('.graph');
+    if (!graph || drawn[graph.dataset.figure]) { return; }
+    drawn[graph.dataset.figure] = true;
+    fetch(graph.dataset.figure).then(function (response) { return response.json(); }).then(function (figure) {
+      Plotly.newPlot(graph, figure.data, figure.layout, JSON.parse(graph.dataset.config));
+    });
+  }
+  function show(section, tab) {
+    section.querySelectorAll('.tab').forEach(function (button) {
+      button.classList.toggle('selected', button.dataset.tab === tab);
+    });
+    section.querySelectorAll('.panel').forEach(function (panel) {
+      panel.hidden = panel.dataset.tab !== tab;
+      if (!panel.hidden) { draw(panel); }
+    });
+  }
+  document.querySelectorAll('.section').forEach(function (section) {
+    section.querySelectorAll('.tab').forEach(function (button) {
+      button.addEventListener('click', function () { show(section, button.dataset.tab); });
+    });
+    show(section, section.dataset.default);
+  });
+})();
+'''
+
+pageStyle = '''
+body { background-color: white; padding: 10px; color: #282A2A;
+       font-family: Futura, Trebuchet MS, Verdana, Sans-serif; }
+.section { border: 1px #f9f9f9 solid; border-radius: 10px; box-shadow: 10px 5px 8px #e6e6e6;
+           background-color: white; padding: 20px; }
+.tabs { display: flex; }
+.tab { flex: 1; border: none; border-bottom: 1px solid #d6d6d6; background: ghostwhite; border-radius: 0;
+       margin: 0; text-transform: none; letter-spacing: normal; font-weight: normal; }
+.tab.selected { background: white; border-top: 2px solid lightsteelblue; border-bottom: none; }
+.quad { text-align: center; border: 1px #f9f9f9 solid; border-radius: 10px; box-shadow: 10px 5px 8px #e6e6e6;
+        background-color: white; padding: 2px; }
+.graph { min-height: 450px; }
+'''
+
+pageTemplate = '''<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>The Indicator App</title>
+<link rel="icon" href="{favicon}">
+<link rel="stylesheet" href="https://codepen.io/chriddyp/pen/bWLwgP.css">
+<link rel="stylesheet" href="{stylesheet}">
+</head>
+<body>
+<div style="background: white; width: 100%">
+<img src="{icon}" alt="The Indicator App Logo" style="width: 100px; height: 100px">
+<h1 style="display: inline-block; width: 65%; color: #282A2A; font-weight: bold">The Indicator</h1>
+</div>
+<br><br>
+{sections}
+<div style="width: 100%; text-align: right">
+<p><a href="https://cansufreeman.com" style="color: lightsteelblue">Developed by Cansu Freeman</a></p>
+<p>Sources: Bureau of Labor Statistics and Federal Reserve Economic Data</p>
+</div>
+<script src="{plotly}"></script>
+<script src="{script}"></script>
+</body>
+</html>
+'''
+
+kpiBoxes = [('totalInitialClaims', ' M', 'Total Claims', 'since March'),
+            ('totalContinuedClaims', ' M', 'Continuing', 'Claims'),
+            ('lastWeekClaims', ' k', 'New Claims Filed', 'Last Week'),
+            ('currentUnempRate', ' %', 'Unemployment Rate', '{unempRateMonth}')]
+
+
+def contentHash(body):
+    return hashlib.sha1(body).hexdigest()[:hashLength]
+
+
+def writeFile(outputDir, path, body):
+    fullPath = os.path.join(outputDir, path)
+    os.makedirs(os.path.dirname(fullPath), exist_ok=True)
+    with open(fullPath, 'wb') as f:
+        f.write(body)
+    with open(fullPath + '.gz', 'wb') as f:
+        f.write(gzip.compress(body, compresslevel=9))
+
+
+# Writes body as <directory>/<name>.<hash><extension> and returns that path
+def writeHashed(outputDir, directory, name, extension, body):
+    path = '%s/%s.%s%s' % (directory, name, contentHash(body), extension)
+    if not os.path.exists(os.path.join(outputDir, path)):
+        writeFile(outputDir, path, body)
+    return path
+
+
+def loadManifest(outputDir):
+    try:
+        with open(os.path.join(outputDir, 'manifest.json')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+# Hash of what a chart's bundle is built from: the sha1 of each source file it reads, its registry entry, the
+# template every chart shares and the encoder (exportVersion, and the plotly.js version it encodes for)
+def dependencyKey(figId, hashes):
+    import encoding
+    import figures
+    names = sorted(figures.chartSources(figId))
+    code = json.dumps([exportVersion, encoding.plotlyjsVersion(), figures.charts[figId], figures.template],
+                      sort_keys=True, default=str)
+    return contentHash((''.join('%s=%s;' % (name, hashes.get(name)) for name in names) + code).encode())
+
+
+def exportFigures(outputDir, snap, hashes, previous):
+    import encoding
+    import figures
+    import payloads
+
+    bundles = {}
+    rebuilt = []
+    for figId in figures.charts:
+        key = dependencyKey(figId, hashes)
+        old = previous.get(figId)
+        if old and old['key'] == key and os.path.exists(os.path.join(outputDir, old['file'])):
+            bundles[figId] = old
+            continue
+        body = payloads.serialize(encoding.compactFigure(figures.getFigure(figId, snap))).body
+        bundles[figId] = {'key': key, 'file': writeHashed(outputDir, 'figures', figId, '.json', body)}
+        rebuilt.append(figId)
+    return bundles, rebuilt
+
+
+def sectionHeader(title):
+    return '<div><h4 style="letter-spacing: 2px; font-weight: lighter; text-align: left">%s</h4></div>' % (
+        html.escape(title))
+
+
+def renderKpis(kpis):
+    boxes = []
+    for key, unit, first, second in kpiBoxes:
+        boxes.append('<div class="four columns quad"><br><h3>%s%s</h3><p>%s<br>%s</p><br></div>' % (
+            html.escape(str(kpis[key])), unit, html.escape(first), html.escape(second.format(**kpis))))
+    return ('<div class="row" style="width: 100%%; display: flex; align-items: center; justify-content: center">'
+            '%s</div><br>' % ''.join(boxes))
+
+
+def renderTabs(app, section, snap, bundles):
+    buttons = []
+    panels = []
+    for tab, label in app.sectionTabs(section, snap):
+        if tab in app.customTabs:
+            continue
+        title, figId, text, config = app.tabContent[tab]
+        buttons.append('<button class="tab" data-tab="%s">%s</button>' % (tab, html.escape(label)))
+        panels.append('<div class="panel" data-tab="%s" hidden><h6>%s</h6>'
+                      '<div class="graph" data-figure="%s" data-config="%s"></div><p>%s</p></div>' % (
+                          tab, html.escape(title.format(**snap.kpis)), bundles[figId]['file'],
+                          html.escape(json.dumps(config or {})), html.escape(text.format(**snap.kpis))))
+    return '<div class="section" data-default="%s"><div class="tabs">%s</div>%s</div><br><br>' % (
+        app.defaultTabs[section], ''.join(buttons), ''.join(panels))
+
+
+def renderPage(app, snap, bundles, files):
+    parts = []
+    for section in ['unemployment', 'jobs', 'gdp']:
+        parts.append(sectionHeader(app.sectionTitles[section]))
+        if section == 'unemployment':
+            parts.append(renderKpis(snap.kpis))
+        parts.append(renderTabs(app, section, snap, bundles))
+    return pageTemplate.format(sections='\n'.join(parts), **files)
+
+
+def exportStatic(outputDir):
+    import encoding
+
+    # the same plotly.js the live app serves, so the bundles' encoding (encoding.typedArrays) matches it
+    with open(encoding.plotlyjsPath(), 'rb') as f:
+        plotlyjs = f.read()
+    files = {'plotly': writeHashed(outputDir, 'static', 'plotly', '.min.js', plotlyjs),
+             'script': writeHashed(outputDir, 'static', 'indicator', '.js', pageScript.encode('utf-8'))}
+    with open(os.path.join(baseDir, 'assets', 'stylesheet.css'), 'rb') as f:
+        files['stylesheet'] = writeHashed(outputDir, 'static', 'stylesheet', '.css', f.read() + pageStyle.encode())
+    for name, asset in [('icon', 'icon.png'), ('favicon', 'favicon.ico')]:
+        stem, extension = os.path.splitext(asset)
+        with open(os.path.join(baseDir, 'assets', asset), 'rb') as f:
+            files[name] = writeHashed(outputDir, 'assets', stem, extension, f.read())
+    return files
+
+
+# Hashed files no longer referenced by the manifest are left from older exports
+def removeStale(outputDir, manifest):
+    referenced = set(manifest['files'].values()) | {bundle['file'] for bundle in manifest['figures'].values()}
+    for directory in ['figures', 'static', 'assets']:
+        for name in os.listdir(os.path.join(outputDir, directory)):
+            path = '%s/%s' % (directory, name)
+            if path not in referenced and (path[:-3] if path.endswith('.gz') else path) not in referenced:
+                os.remove(os.path.join(outputDir, path))
+
+
+def export(outputDir):
+    import app
+    import loader
+    import snapshot
+
+    os.makedirs(outputDir, exist_ok=True)
+    previous = loadManifest(outputDir)
+    _, hashes = loader.loadSources()
+    snap = snapshot.get()
+
+    bundles, rebuilt = exportFigures(outputDir, snap, hashes, previous.get('figures', {}))
+    files = exportStatic(outputDir)
+    writeFile(outputDir, 'index.html', renderPage(app, snap, bundles, files).encode('utf-8'))
+
+    manifest = {'version': snap.version, 'figures': bundles, 'files': files}
+    with open(os.path.join(outputDir, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    removeStale(outputDir, manifest)
+    return manifest, rebuilt
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Prerender the dashboard into static files for a CDN')
+    parser.add_argument('--output', default=os.path.join(baseDir, 'dist'), help='output directory (default: dist)')
+    parser.add_argument('--clean', action='store_true', help='rebuild every chart bundle')
+    args = parser.parse_args()
+
+    if args.clean:
+        shutil.rmtree(args.output, ignore_errors=True)
+    manifest, rebuilt = export(args.output)
+    print('data version %s: rebuilt %d of %d charts (%s)' % (manifest['version'], len(rebuilt),
+                                                             len(manifest['figures']), ', '.join(rebuilt) or '-'))
@@ -0,0 +1,284 @@
+import os
+from collections import namedtuple
+
+import numpy as np
+import plotly.io as pio
+from plotly.graph_objs.layout import Template
+
+import claims
+import rolling
+import sectors
+import store
+import metrics
+from cache import LRUCache
+from styles import (colorOne, colorTwo, colorThree, fontFamily, xaxisTemplateStyle, yaxisTemplateStyle, marginStyle,
+                    legendStyle, xaxisYearlyStyle, xaxisMonthlyStyle, xaxisSectorStyle, xaxisSectorPercentStyle,
+                    yaxisStyle, yaxisPercentStyle, yaxisSectorStyle)
+
+
+# Bytes of the arrays in a figure's traces (x, y, per-point colors), for the caches' byte bounds
+def figureBytes(figure):
+    total = 0
+    for trace in figure['data']:
+        for value in list(trace.values()) + [trace.get('marker', {}).get('color'), trace.get('line', {}).get('color')]:
+            if isinstance(value, np.ndarray):
+                total += value.nbytes
+    return total
+
+
+# Built figures are kept per (figure id, date range, data version); a tab's figure is only built the first time it
+# is shown. Custom date ranges make the number of keys open-ended, so the caches are bounded by bytes as well.
+figureCacheBytes = int(os.environ.get('INDICATOR_FIGURE_CACHE_BYTES', 64 * 1024 * 1024))
+figureCache = metrics.registerCache('figures', LRUCache(maxEntries=256, maxBytes=figureCacheBytes,
+                                                        sizeOf=figureBytes))
+
+# State claims figures per (selected states, aggregation, date range, data version), so popular selections are
+# built once
+stateClaimsCache = metrics.registerCache('stateClaims', LRUCache(maxEntries=64, maxBytes=figureCacheBytes,
+                                                                 sizeOf=figureBytes))
+
+# Date-range slices of store series per (series id, date range, data version), shared by every chart that plots
+# the series. A slice is a binary search on the sorted dates (Series.slice), copied so an entry left from an older
+# data version does not keep that version's arrays alive.
+sliceCacheBytes = int(os.environ.get('INDICATOR_SLICE_CACHE_BYTES', 16 * 1024 * 1024))
+sliceCache = metrics.registerCache('slices', LRUCache(maxEntries=512, maxBytes=sliceCacheBytes,
+                                                      sizeOf=lambda series: series.nbytes))
+
+# CHART TEMPLATE
+# Styling every chart shares, defined once as the 'indicator' plotly.io template. plotly.js has no registry of named
+# templates (layout.template must be the template object itself) and dcc.Graph hands figures to plotly.js as they
+# are, so every figure still carries this template, ~600 bytes, in its layout. It replaces plotly's default one,
+# which alone was ~7 kB of every serialized figure; the charts' own axis settings are kept out of it.
+pio.templates['indicator'] = Template(
+    layout={'font': {'family': fontFamily, 'color': '#2a3f5f'},
+            'xaxis': xaxisTemplateStyle,
+            'yaxis': yaxisTemplateStyle,
+            'margin': marginStyle,
+            'paper_bgcolor': 'white',
+            'plot_bgcolor': 'white',
+            'legend': legendStyle,
+            'hovermode': 'x',
+            'hoverlabel': {'align': 'left'}},
+    data={'bar': [{'marker': {'line': {'color': '#E5ECF6', 'width': 0.5}}}]})
+pio.templates.default = 'indicator'
+template = pio.templates['indicator'].to_plotly_json()
+
+# CHARTS
+# Each chart is a list of traces plus its axes. A trace's source is a series id in the store, or 'sectors:<metric>'
+# for the latest month of a sector cube metric as horizontal bars. color='sign' colors negative values red and the
+# rest green.
+Trace = namedtuple('Trace', ['source', 'type', 'name', 'color'])
+Chart = namedtuple('Chart', ['traces', 'xaxis', 'yaxis', 'hovermode'])
+
+signColors = 'sign'
+sectorSource = 'sectors:'
+
+charts = {
+    # Recent Initial and Continued Claims for Unemployment Nationally
+    'fig1': Chart([Trace('ICSA', 'line', 'Initial Claims', colorOne),
+                   Trace('CCSA', 'line', 'Continuing Claims', colorTwo)],
+                  xaxisMonthlyStyle, yaxisStyle, 'closest'),
+    # Historical Initial Claims Nationally
+    'fig2': Chart([Trace('ICSA_HIST', 'bar', 'Initial Claims', colorOne),
+                   Trace('ICSA_4WK', 'line', '4-Week Average', colorTwo)], xaxisYearlyStyle, yaxisStyle, 'x'),
+    # Unemployment Rate since 2007
+    'fig3': Chart([Trace('UNRATE', 'bar', 'Unemployment Rate', colorOne)], xaxisYearlyStyle, yaxisPercentStyle, 'x'),
+    # U6 Unemployment Rate
+    'fig4': Chart([Trace('U6RATE', 'line', 'U6', colorTwo),
+                   Trace('UNRATE', 'line', 'Unemployment Rate', colorOne)],
+                  xaxisYearlyStyle, yaxisPercentStyle, 'x unified'),
+    # Payroll Jobs, Month over Year
+    'fig5': Chart([Trace('PAYEMS_12M', 'bar', 'MoY Change in Payroll Jobs', colorTwo)],
+                  xaxisYearlyStyle, yaxisStyle, 'x'),
+    # Month to Month Payroll Jobs Change
+    'fig6': Chart([Trace('PAYEMS_1M', 'bar', 'MoY Change in Payroll Jobs', colorTwo),
+                   Trace('PAYEMS_1M_3MA', 'line', '3-Month Average', colorOne)],
+                  xaxisYearlyStyle, yaxisStyle, 'x'),
+    # Recent Month (1M) and Yearly (12M) Change Payroll Jobs by Sector
+    'fig7': Chart([Trace(sectorSource + '1M', 'bar', None, signColors)], xaxisSectorStyle, yaxisSectorStyle,
+                  'closest'),
+    'fig8': Chart([Trace(sectorSource + '12M', 'bar', None, signColors)], xaxisSectorStyle, yaxisSectorStyle,
+                  'closest'),
+    # Percent Change per Quarter Real GDP
+    'fig9': Chart([Trace('GDP_PCT', 'bar', 'Percent Change', signColors)], xaxisYearlyStyle, yaxisPercentStyle, 'x'),
+    # Quarterly Real GDP (trillions)
+    'fig10': Chart([Trace('GDP', 'line', 'Real GDP', colorTwo)], xaxisYearlyStyle, yaxisStyle, 'x'),
+    # Initial Claims in 2020 against 2008, aligned on the start of each recession (see rolling.analogs)
+    'fig11': Chart([Trace('ICSA', 'line', '2020', colorOne),
+                    Trace('ICSA_2008_ANALOG', 'line', '2008, from December 2007', colorTwo)],
+                   xaxisMonthlyStyle, yaxisStyle, 'x unified'),
+    # Initial Claims z-score against the year before
+    'fig12': Chart([Trace('ICSA_Z52', 'bar', 'Standard deviations from the trailing year', signColors)],
+                   xaxisYearlyStyle, yaxisStyle, 'x'),
+}
+
+
+# Names in loader.sources a series (including derived ones, see rolling.py) is read from
+def seriesSources(seriesId):
+    if seriesId in rolling.definitions:
+        return seriesSources(rolling.definitions[seriesId][0])
+    if seriesId in rolling.analogs:
+        return seriesSources(rolling.analogs[seriesId][0])
+    return {store.definitions[seriesId][0]}
+
+
+# Names in loader.sources a chart depends on: it only changes when one of these files does
+def chartSources(figId):
+    dependencies = set()
+    for trace in charts[figId].traces:
+        if trace.source.startswith(sectorSource):
+            dependencies.update(name for names, _, _ in sectors.sectors for name in names)
+        else:
+            dependencies.update(seriesSources(trace.source))
+    return dependencies
+
+
+# A store series cut to a date range; the full range is the series itself
+def getSlice(snap, seriesId, dateRange=store.fullRange):
+    if dateRange == store.fullRange:
+        return snap.store[seriesId]
+    return sliceCache.getOrBuild((seriesId, dateRange, snap.version),
+                                 lambda: snap.store[seriesId].slice(*dateRange).copy())
+
+
+def buildTrace(snap, trace, dateRange):
+    if trace.source.startswith(sectorSource):
+        values = snap.sectors.values(trace.source[len(sectorSource):]) * sectors.levelScale
+        spec = {'type': 'bar', 'orientation': 'h', 'x': values, 'y': sectors.labels,
+                'text': (values / 1000).round(1), 'textposition': 'outside'}
+    else:
+        series = getSlice(snap, trace.source, dateRange)
+        values = series.values
+        spec = {'type': 'bar', 'x': series.dates, 'y': values}
+        if trace.type == 'line':
+            spec.update(type='scatter', mode='lines')
+    if trace.name is not None:
+        spec['name'] = trace.name
+    color = np.where(values < 0, colorThree, colorOne) if trace.color == signColors else trace.color
+    spec['line' if trace.type == 'line' else 'marker'] = {'color': color}
+    return spec
+
+
+# Figures are plain dicts in plotly's JSON schema: dcc.Graph takes them as they are, and skipping the validation
+# of graph_objs is most of the build time. x values stay datetime64 until encoding.compactFigure picks their wire form.
+# Sector bars show one month, so a date range only applies to the time-series traces
+def buildChart(snap, chart, dateRange=store.fullRange):
+    return {'data': [buildTrace(snap, trace, dateRange) for trace in chart.traces],
+            'layout': {'template': template, 'xaxis': chart.xaxis, 'yaxis': chart.yaxis, 'hovermode': chart.hovermode}}
+
+
+def buildFigure(figId, snap, dateRange=store.fullRange):
+    with metrics.timed(figId):
+        return buildChart(snap, charts[figId], dateRange)
+
+
+# dateRange as normalized by store.dateRange
+def getFigure(figId, snap, dateRange=store.fullRange):
+    return figureCache.getOrBuild((figId, dateRange, snap.version), lambda: buildFigure(figId, snap, dateRange))
+
+
+# SECTOR EXPLORER
+# Any month and metric of the sector cube as bars, and any sectors' metric over time as lines. Both are cached in
+# figureCache like the registry charts.
+sectorColors = [colorOne, colorTwo, colorThree, 'goldenrod', 'mediumpurple', 'darkgray']
+
+
+def sectorScale(metric):
+    return 1 if metric in sectors.percentMetrics else sectors.levelScale
+
+
+# sort is 'value' (largest first, by the cube's precomputed ranks) or 'sector' (the order of sectors.sectors)
+def buildSectorBars(snap, metric, month, sort):
+    values = snap.sectors.values(metric, month) * sectorScale(metric)
+    order = np.argsort(snap.sectors.ranking(metric, month)) if sort == 'value' else np.arange(len(values))
+    # horizontal bars are drawn bottom-up, so the first sector goes last
+    order = order[::-1]
+    values = values[order]
+    if metric in sectors.percentMetrics:
+        text = values.round(1)
+    else:
+        text = (values / 1000).round(1)
+    trace = {'type': 'bar', 'orientation': 'h', 'x': values, 'y': [sectors.labels[i] for i in order], 'text': text,
+             'textposition': 'outside', 'marker': {'color': np.where(values < 0, colorThree, colorOne)}}
+    return {'data': [trace],
+            'layout': {'template': template,
+                       'xaxis': xaxisSectorPercentStyle if metric in sectors.percentMetrics else xaxisSectorStyle,
+                       'yaxis': yaxisSectorStyle, 'hovermode': 'closest'}}
+
+
+def buildSectorHistory(snap, metric, rows, dateRange):
+    months, values = snap.sectors.history(metric, rows)
+    dates = months.astype('datetime64[D]')
+    lo, hi = store.rangeBounds(dates, *dateRange)
+    dates, values = dates[lo:hi], values[:, lo:hi] * sectorScale(metric)
+    traces = [{'type': 'scatter', 'mode': 'lines', 'x': dates, 'y': values[i], 'name': sectors.labels[row],
+               'line': {'color': sectorColors[i % len(sectorColors)]}} for i, row in enumerate(rows)]
+    return {'data': traces,
+            'layout': {'template': template, 'xaxis': xaxisYearlyStyle,
+                       'yaxis': yaxisPercentStyle if metric in sectors.percentMetrics else yaxisStyle,
+                       'hovermode': 'x unified'}}
+
+
+def getSectorBars(snap, metric, month, sort):
+    return figureCache.getOrBuild(('sectorBars', metric, month, sort, snap.version),
+                                  lambda: buildSectorBars(snap, metric, month, sort))
+
+
+def getSectorHistory(snap, metric, rows, dateRange=store.fullRange):
+    rows = sorted(set(rows))
+    return figureCache.getOrBuild(('sectorHistory', metric, tuple(rows), dateRange, snap.version),
+                                  lambda: buildSectorHistory(snap, metric, rows, dateRange))
+
+
+# Both the total and the per-capita series are shipped; the view toggle (assets/views.js) shows one of them by meta
+def buildStateClaimsFigure(snap, codes, how, dateRange):
+    traces = []
+    with metrics.timed('stateClaimsFigure'):
+        for meta, perCapita, color in [('total', False, colorOne), ('perCapita', True, colorTwo)]:
+            series = snap.stateClaims.select(codes, how, perCapita, *dateRange)
+            traces.append({'type': 'scatter', 'mode': 'lines', 'x': series.dates, 'y': series.values,
+                           'name': claims.aggregations[how], 'meta': meta, 'visible': not perCapita,
+                           'line': {'color': color}})
+    return {'data': traces,
+            'layout': {'template': template, 'xaxis': xaxisYearlyStyle, 'yaxis': yaxisStyle, 'hovermode': 'x'}}
+
+
+# Weekly initial claims of the selected states (all of them for an empty selection) combined with `how`
+def getStateClaimsFigure(snap, codes, how, dateRange=store.fullRange):
+    key = (tuple(sorted(set(codes or ()))), how, dateRange, snap.version)
+    return stateClaimsCache.getOrBuild(key, lambda: buildStateClaimsFigure(snap, key[0], how, dateRange))
+
+
+# REVISIONS
+# A revised series as of the latest release, overlaid with earlier vintages (release dates, or 'first' for every
+# observation as first reported). Cached in figureCache like the registry charts.
+vintageDash = {'first': 'dot'}
+
+
+def vintageName(day):
+    return 'As first reported' if day == 'first' else 'As of ' + day
+
+
+def buildVintageFigure(snap, seriesId, days, dateRange):
+    scale = sectors.levelScale if seriesId.startswith('SECTOR_') else 1
+    traces = []
+    with metrics.timed('vintageFigure'):
+        for i, day in enumerate([None] + days):
+            series = snap.vintages.asOf(seriesId, day)
+            if series is None:
+                continue
+            series = series.slice(*dateRange)
+            traces.append({'type': 'scatter', 'mode': 'lines', 'x': series.dates, 'y': series.values * scale,
+                           'name': 'Latest' if day is None else vintageName(day),
+                           'line': {'color': sectorColors[i % len(sectorColors)],
+                                    'dash': 'solid' if day is None else vintageDash.get(day, 'dash')}})
+    return {'data': traces,
+            'layout': {'template': template, 'xaxis': xaxisYearlyStyle,
+                       'yaxis': yaxisPercentStyle if seriesId == 'GDP_PCT' else yaxisStyle, 'hovermode': 'x unified'}}
+
+
+# `days` are vintages.VintageStore.asOf days; the latest release is always drawn
+def getVintageFigure(snap, seriesId, days, dateRange=store.fullRange):
+    days = sorted(set(days or ()), key=lambda day: (day != 'first', day))
+    return figureCache.getOrBuild(('vintages', seriesId, tuple(days), dateRange, snap.version),
+                                  lambda: buildVintageFigure(snap, seriesId, days, dateRange))
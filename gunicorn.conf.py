@@ -0,0 +1,47 @@
+import gc
+import os
+
+# GUNICORN
+# Preload mode (the default, INDICATOR_PRELOAD=0 turns it off): the master imports app.py, loads the data and
+# serializes the layout and default tabs once (when_ready), then forks the workers. The snapshot's arrays and payload
+# bytes are shared copy-on-write instead of every worker building its own copy, so more workers fit in one dyno.
+# After a data refresh each worker holds its own new snapshot until it is recycled.
+
+bind = '0.0.0.0:' + os.environ.get('PORT', '8000')
+workers = int(os.environ.get('WEB_CONCURRENCY', 4))
+preload_app = os.environ.get('INDICATOR_PRELOAD', '1') != '0'
+
+if preload_app:
+    # a refresh thread running in the master could be forked mid-refresh; workers start theirs in post_fork
+    os.environ['INDICATOR_DEFER_SCHEDULER'] = '1'
+
+
+def megabytes(usage):
+    return ', '.join('%s %.1f MB' % (key, value / 1048576) for key, value in usage.items() if value is not None)
+
+
+def when_ready(server):
+    if preload_app:
+        import snapshot
+        # importing app.py loads no data; load it here, before the workers are forked
+        snapshot.get()
+        # move everything loaded so far out of the collector's reach, so collections in the workers don't write
+        # to (and unshare) the pages of the preloaded objects
+        gc.collect()
+        gc.freeze()
+        server.log.info('preloaded snapshot %s, master %s', snapshot.current.version,
+                        megabytes(snapshot.memoryUsage()))
+
+
+def post_fork(server, worker):
+    if preload_app:
+        import snapshot
+        snapshot.startScheduler()
+
+
+# A worker only starts accepting connections after this returns, so it never serves without a snapshot
+def post_worker_init(worker):
+    import snapshot
+    snap = snapshot.get()
+    worker.log.info('worker %s ready with snapshot %s, %s', worker.pid, snap.version,
+                    megabytes(snapshot.memoryUsage()))
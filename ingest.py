@@ -0,0 +1,373 @@
+import argparse
+import csv
+import io
+import json
+import logging
+import os
+import random
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+import loader
+import vintages
+
+logger = logging.getLogger(__name__)
+
+# ENDPOINTS
+# Overridable so ingestion can be pointed at a local stand-in server
+fredUrl = os.environ.get('INDICATOR_FRED_URL', 'https://fred.stlouisfed.org/graph/fredgraph.csv')
+blsUrl = os.environ.get('INDICATOR_BLS_URL', 'https://api.bls.gov/publicAPI/v2/timeseries/data/')
+blsKey = os.environ.get('BLS_API_KEY')
+
+maxWorkers = int(os.environ.get('INDICATOR_INGEST_WORKERS', 4))
+timeoutSeconds = float(os.environ.get('INDICATOR_INGEST_TIMEOUT', 15))
+maxAttempts = 4
+backoffSeconds = 0.5
+
+# ETag/Last-Modified of the previous successful fetch of each series
+statePath = os.path.join(loader.cacheDir, 'ingest-state.json')
+
+
+# DERIVED COLUMNS
+# Each takes the full level history (existing rows + new ones) and returns the extra columns of the file
+
+def lagDiff(levels, lag):
+    diff = np.full(len(levels), np.nan)
+    diff[lag:] = levels[lag:] - levels[:-lag]
+    return diff
+
+
+def inMillions(levels):
+    return {'in_millions': levels / 1000000}
+
+
+def payrollChanges(levels):
+    return {'1M Change': lagDiff(levels, 1), '12M Change': lagDiff(levels, 12)}
+
+
+def percentChange(levels):
+    change = np.full(len(levels), np.nan)
+    change[1:] = (levels[1:] / levels[:-1] - 1) * 100
+    return {'Percent Change': change}
+
+
+def sectorChanges(prefix):
+    def derive(levels):
+        return {prefix + ' 12M': lagDiff(levels, 12), prefix + ' 1M': lagDiff(levels, 1)}
+    return derive
+
+
+# SERIES
+# One remote series can feed several local files (ICSA feeds both the recent and historical claims files)
+Target = namedtuple('Target', ['path', 'column', 'scale', 'dateFormat', 'derive'])
+Series = namedtuple('Series', ['source', 'remoteId', 'targets'])
+FetchResult = namedtuple('FetchResult', ['remoteId', 'status', 'seconds', 'bytes', 'attempts', 'appended', 'error'])
+
+dayFormat = '%Y-%m-%d'
+monthFormat = '%Y-%m'
+
+sectorSeries = [
+    ('construction.csv', 'construction', 'constr', 'CES2000000001'),
+    ('educationHealth.csv', 'educationHealth', 'eduHealth', 'CES6500000001'),
+    ('federalGovt.csv', 'federalGovt', 'fedGovt', 'CES9091000001'),
+    ('financial.csv', 'financial', 'financial', 'CES5500000001'),
+    ('information.csv', 'information', 'info', 'CES5000000001'),
+    ('leisureHosp.csv', 'leisureHosp', 'leisureHosp', 'CES7000000001'),
+    ('manufacturing.csv', 'mfg', 'mfg', 'CES3000000001'),
+    ('otherServices.csv', 'otherServices', 'other', 'CES8000000001'),
+    ('profBusServ.csv', 'profBusServ', 'profBusServ', 'CES6000000001'),
+    ('retailTrade.csv', 'retailTrade', 'retailTrade', 'CES4200000001'),
+    ('transportation.csv', 'transportation', 'transp', 'CES4300000001'),
+    ('wholesaleTrade.csv', 'wholesaleTrade', 'wholesale', 'CES4142000001'),
+]
+
+series = [
+    Series('fred', 'ICSA', [Target('fredICSA.csv', 'ICSA', 1, dayFormat, inMillions),
+                            Target('ICSA_historical.csv', 'ICSA', 1, dayFormat, None)]),
+    Series('fred', 'CCSA', [Target('fredCCSA.csv', 'CCSA', 1, dayFormat, inMillions)]),
+    Series('fred', 'GDPC1', [Target('realGDP.csv', 'Real GDP', 1000000000, dayFormat, percentChange)]),
+    Series('bls', 'CEU0000000001', [Target('PayrollJobs.csv', 'Payroll Jobs', 1000, monthFormat, payrollChanges)]),
+    Series('bls', 'LNS14000000', [Target('unemploymentRate.csv', 'Unemployment Rate', 1, monthFormat, None)]),
+    Series('bls', 'LNS13327709', [Target('U6unemployment.csv', 'U6', 1, monthFormat, None)]),
+] + [Series('bls', remoteId, [Target('payroll-jobs-by-sector/' + path, column, 1, monthFormat, sectorChanges(prefix))])
+     for path, column, prefix, remoteId in sectorSeries] + \
+    [Series('fred', code + 'ICLAIMS', [Target(loader.optionalSources['state_' + code], 'Initial Claims', 1, dayFormat,
+                                              None)])
+     for code in loader.stateCodes]
+
+# files that do not exist yet are fetched from here on
+firstDate = pd.Timestamp('1967-01-01').date()
+
+# REVISIONS
+# remote id -> vintages.tracked id of the series that are revised after they are first published
+vintageIds = {'CEU0000000001': 'PAYEMS', 'GDPC1': 'GDP'}
+vintageIds.update({remoteId: 'SECTOR_' + column for _, column, _, remoteId in sectorSeries})
+
+# revised series are fetched from this many days before the file's last row, so the revisions a release makes are
+# recorded (recordVintage) and written to the file (appendObservations)
+revisionDays = int(os.environ.get('INDICATOR_REVISION_DAYS', 400))
+
+
+# HTTP
+# Anything with get(url, headers=, timeout=) returning an object with status_code, headers and content will do,
+# e.g. a fake for tests or a session pointed at a local server
+
+class RequestsFetcher:
+
+    def __init__(self):
+        import requests
+        self.session = requests.Session()
+
+    def get(self, url, headers=None, timeout=None):
+        return self.session.get(url, headers=headers, timeout=timeout)
+
+
+class RetryableStatus(Exception):
+    pass
+
+
+# PARSERS (return a list of (date, value) in ascending date order)
+
+def parseFred(body):
+    rows = csv.reader(io.StringIO(body.decode('utf-8')))
+    next(rows)  # DATE/observation_date, <series id>
+    return [(np.datetime64(day, 'D'), float(value)) for day, value in rows if value not in ('', '.')]
+
+
+def parseBls(body):
+    payload = json.loads(body)
+    if payload.get('status') != 'REQUEST_SUCCEEDED':
+        raise ValueError('BLS: %s' % ' '.join(payload.get('message', [])))
+    observations = []
+    for obs in payload['Results']['series'][0]['data']:
+        if obs['period'].startswith('M') and obs['period'] != 'M13':
+            observations.append((np.datetime64('%s-%s-01' % (obs['year'], obs['period'][1:]), 'D'),
+                                 float(obs['value'])))
+    return sorted(observations)
+
+
+parsers = {'fred': parseFred, 'bls': parseBls}
+
+
+# LOCAL STORE
+
+def targetPath(target):
+    return os.path.join(loader.dataDir, target.path)
+
+
+def lastLocalDate(target):
+    try:
+        with open(targetPath(target)) as f:
+            lastLine = f.read().rstrip('\n').rsplit('\n', 1)[-1]
+    except FileNotFoundError:
+        return firstDate
+    return pd.Timestamp(lastLine.split(',', 1)[0]).date()
+
+
+def seriesUrl(entry):
+    start = min(lastLocalDate(target) for target in entry.targets)
+    if entry.remoteId in vintageIds:
+        start -= timedelta(days=revisionDays)
+    if entry.source == 'fred':
+        return '%s?id=%s&cosd=%s' % (fredUrl, entry.remoteId, start.isoformat())
+    url = '%s%s?startyear=%d&endyear=%d' % (blsUrl, entry.remoteId, start.year, max(start.year, time.gmtime().tm_year))
+    if blsKey:
+        url += '&registrationkey=' + blsKey
+    return url
+
+
+# A release's value for each existing row (NaN for rows it does not cover) and which rows it revised
+def revisedRows(existing, target, observations):
+    released = {pd.Timestamp(day).strftime(target.dateFormat): value * target.scale for day, value in observations}
+    values = existing['Date'].map(released).to_numpy(dtype=float)
+    current = existing[target.column].to_numpy(dtype=float)
+    return values, np.isfinite(values) & ~np.isclose(values, current, rtol=1e-12, atol=0)
+
+
+# Appends the observations newer than the file's last row, recomputing its derived columns from the full history.
+# With revise (series fetched with a revisionDays overlap), rows the release revised are rewritten too, along with
+# the derived columns from the first revised row on; earlier rows keep the values they were published with.
+# The file is rewritten through a temp file so a concurrent snapshot refresh never reads a partial row.
+# A file that does not exist yet is created with every observation. Returns the number of rows appended.
+def appendObservations(target, observations, revise=False):
+    path = targetPath(target)
+    if not os.path.exists(path):
+        return createFile(target, observations)
+    existing = pd.read_csv(path, header=0)
+    lastDate = existing['Date'].iloc[-1]
+    newRows = [(pd.Timestamp(day).strftime(target.dateFormat), value * target.scale)
+               for day, value in observations if pd.Timestamp(day).strftime(target.dateFormat) > lastDate]
+    released, changed = revisedRows(existing, target, observations) if revise else (None, None)
+    revised = int(changed.sum()) if revise else 0
+    if not newRows and not revised:
+        return 0
+
+    rows = pd.DataFrame(newRows, columns=['Date', target.column])
+    if revised:
+        existing.loc[changed, target.column] = released[changed]
+        logger.info('%s: %d rows revised', target.path, revised)
+    if target.derive is not None:
+        known = len(existing)
+        first = int(np.argmax(changed)) if revised else known
+        levels = np.concatenate([existing[target.column].to_numpy(dtype=float), rows[target.column].to_numpy()])
+        for column, values in target.derive(levels).items():
+            rows[column] = values[known:]
+            existing.iloc[first:, existing.columns.get_loc(column)] = values[first:known]
+    rows = rows[list(existing.columns)]
+
+    tmpPath = path + '.%d.tmp' % os.getpid()
+    if revised:
+        pd.concat([existing, rows], ignore_index=True).to_csv(tmpPath, index=False)
+    else:
+        with open(path, 'rb') as src, open(tmpPath, 'wb') as dst:
+            dst.write(src.read())
+            dst.write(rows.to_csv(header=False, index=False).encode('utf-8'))
+    os.replace(tmpPath, path)
+    return len(rows)
+
+
+def createFile(target, observations):
+    path = targetPath(target)
+    rows = pd.DataFrame([(pd.Timestamp(day).strftime(target.dateFormat), value * target.scale)
+                         for day, value in observations], columns=['Date', target.column])
+    if rows.empty:
+        return 0
+    if target.derive is not None:
+        for column, values in target.derive(rows[target.column].to_numpy()).items():
+            rows[column] = values
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmpPath = path + '.%d.tmp' % os.getpid()
+    rows.to_csv(tmpPath, index=False)
+    os.replace(tmpPath, path)
+    return len(rows)
+
+
+# Records the fetched observations of a revised series as a release in its vintage log, returning the number of
+# observations that were new or revised. The first time, the file's history is recorded as a release dated when the
+# file was last written.
+def recordVintage(entry, observations):
+    vintageId = vintageIds.get(entry.remoteId)
+    if vintageId is None or not observations:
+        return 0
+    target = entry.targets[0]
+    path = targetPath(target)
+    if not vintages.hasLog(vintageId) and os.path.exists(path):
+        frames = {}
+        for name in vintages.tracked[vintageId][0]:
+            frame, _ = loader.loadFrame(name)
+            if frame is not None:
+                frames[name] = frame
+        vintages.record(vintageId, *vintages.trackedLevels(vintageId, frames),
+                        release=date.fromtimestamp(os.path.getmtime(path)))
+    dates, values = zip(*observations)
+    return vintages.record(vintageId, dates, np.array(values) * target.scale)
+
+
+# FETCHING
+
+def fetchSeries(entry, fetcher, previous):
+    url = seriesUrl(entry)
+    headers = {}
+    if previous and previous.get('url') == url:
+        if previous.get('etag'):
+            headers['If-None-Match'] = previous['etag']
+        if previous.get('lastModified'):
+            headers['If-Modified-Since'] = previous['lastModified']
+
+    started = time.perf_counter()
+    for attempt in range(1, maxAttempts + 1):
+        try:
+            response = fetcher.get(url, headers=headers, timeout=timeoutSeconds)
+            if response.status_code == 429 or response.status_code >= 500:
+                raise RetryableStatus('HTTP %d' % response.status_code)
+            return url, response, attempt, time.perf_counter() - started
+        except Exception as error:
+            if attempt == maxAttempts:
+                raise
+            delay = backoffSeconds * 2 ** (attempt - 1) * random.uniform(1, 1.5)
+            logger.warning('%s: %s, retrying in %.1fs', entry.remoteId, error, delay)
+            time.sleep(delay)
+
+
+def loadState():
+    try:
+        with open(statePath) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def saveState(state):
+    os.makedirs(os.path.dirname(statePath), exist_ok=True)
+    tmpPath = statePath + '.tmp'
+    with open(tmpPath, 'w') as f:
+        json.dump(state, f, indent=1, sort_keys=True)
+    os.replace(tmpPath, statePath)
+
+
+# Fetches every series concurrently on a bounded pool and appends what is new.
+# Returns one FetchResult per series with its latency and bytes transferred.
+def ingest(entries=None, fetcher=None):
+    entries = series if entries is None else entries
+    fetcher = fetcher or RequestsFetcher()
+    state = loadState()
+    results = []
+
+    with ThreadPoolExecutor(max_workers=maxWorkers) as pool:
+        futures = {pool.submit(fetchSeries, entry, fetcher, state.get(entry.remoteId)): entry for entry in entries}
+        for future in as_completed(futures):
+            entry = futures[future]
+            try:
+                url, response, attempts, seconds = future.result()
+            except Exception as error:
+                results.append(FetchResult(entry.remoteId, None, None, 0, maxAttempts, 0, str(error)))
+                continue
+
+            appended = 0
+            error = None
+            if response.status_code == 200:
+                try:
+                    observations = parsers[entry.source](response.content)
+                    revised = recordVintage(entry, observations)
+                    if revised:
+                        logger.info('%s: %d observations new or revised', entry.remoteId, revised)
+                    appended = sum(appendObservations(target, observations, entry.remoteId in vintageIds)
+                                   for target in entry.targets)
+                    state[entry.remoteId] = {'url': url,
+                                             'etag': response.headers.get('ETag'),
+                                             'lastModified': response.headers.get('Last-Modified')}
+                except (ValueError, KeyError, IndexError) as parseError:
+                    error = 'unparseable response: %s' % parseError
+            elif response.status_code != 304:
+                error = 'HTTP %d' % response.status_code
+            results.append(FetchResult(entry.remoteId, response.status_code, seconds, len(response.content or b''),
+                                       attempts, appended, error))
+
+    saveState(state)
+    return results
+
+
+def report(results):
+    lines = ['%-15s %6s %8s %10s %8s  %s' % ('series', 'status', 'seconds', 'bytes', 'appended', 'error')]
+    for result in sorted(results, key=lambda r: r.remoteId):
+        lines.append('%-15s %6s %8s %10d %8d  %s' % (
+            result.remoteId, result.status or '-', '%.3f' % result.seconds if result.seconds is not None else '-',
+            result.bytes, result.appended, result.error or ''))
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Append new FRED/BLS observations to the files in data/')
+    parser.add_argument('series', nargs='*', help='remote series ids to fetch (default: all)')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s %(message)s')
+
+    selected = [entry for entry in series if not args.series or entry.remoteId in args.series]
+    results = ingest(selected)
+    print(report(results))
+    raise SystemExit(1 if any(result.error for result in results) else 0)
@@ -0,0 +1,171 @@
+import hashlib
+import io
+import os
+import urllib.error
+import urllib.request
+
+import numpy as np
+
+# DATA LOCATIONS
+baseDir = os.path.dirname(os.path.abspath(__file__))
+dataDir = os.path.join(baseDir, 'data')
+cacheDir = os.environ.get('INDICATOR_CACHE_DIR', os.path.join(baseDir, '.cache'))
+remoteBaseUrl = 'https://raw.githubusercontent.com/cansu-freeman/indicator-app/master/data/'
+
+# Reading from GitHub is opt-in (INDICATOR_REMOTE_DATA=1); by default the bundled data/ tree is used
+useRemote = os.environ.get('INDICATOR_REMOTE_DATA', '').lower() in {'1', 'true', 'yes'}
+
+# SPREADSHEETS (name -> path relative to data/)
+sources = {
+    'fredICSA': 'fredICSA.csv',
+    'ICSA_historical': 'ICSA_historical.csv',
+    'fredCCSA': 'fredCCSA.csv',
+    'unemploymentRate': 'unemploymentRate.csv',
+    'U6unemployment': 'U6unemployment.csv',
+    'PayrollJobs': 'PayrollJobs.csv',
+    'realGDP': 'realGDP.csv',
+}
+
+# per-sector payroll levels (see sectors.py)
+sectorFiles = ['construction', 'educationHealth', 'federalGovt', 'financial', 'information', 'leisureHosp',
+               'manufacturing', 'otherServices', 'otherServies', 'profBusServ', 'retailTrade', 'transportation',
+               'wholesaleTrade']
+sources.update({'sector_' + name: 'payroll-jobs-by-sector/%s.csv' % name for name in sectorFiles})
+
+# per-state weekly claims (see claims.py); these files only exist once ingest.py has fetched them, so a missing
+# one is skipped instead of failing the load
+stateCodes = ['AL', 'AK', 'AZ', 'AR', 'CA', 'CO', 'CT', 'DE', 'DC', 'FL', 'GA', 'HI', 'ID', 'IL', 'IN', 'IA', 'KS',
+              'KY', 'LA', 'ME', 'MD', 'MA', 'MI', 'MN', 'MS', 'MO', 'MT', 'NE', 'NV', 'NH', 'NJ', 'NM', 'NY', 'NC',
+              'ND', 'OH', 'OK', 'OR', 'PA', 'RI', 'SC', 'SD', 'TN', 'TX', 'UT', 'VT', 'VA', 'WA', 'WV', 'WI', 'WY']
+optionalSources = {'state_' + code: 'state-claims/%s.csv' % code for code in stateCodes}
+sources.update(optionalSources)
+
+
+def fileHash(path):
+    sha = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 16), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+# COLUMNAR CACHE
+# Each CSV is cached as one .npz holding a NumPy array per column. The entry is keyed on the source's
+# size/mtime (cheap check) and its sha1 (so a touched-but-unchanged file, e.g. after a git checkout, still hits).
+
+def cachePath(name):
+    return os.path.join(cacheDir, name + '.npz')
+
+
+# pandas is imported where frames are made, so importing this module (and app.py) stays cheap
+def readCache(name, stat=None, digest=None):
+    import pandas as pd
+    try:
+        with np.load(cachePath(name), allow_pickle=False) as cached:
+            key = cached['__key__']
+            cachedHash = str(cached['__hash__'])
+            fresh = (stat is not None and int(key[0]) == stat.st_size and int(key[1]) == stat.st_mtime_ns) or \
+                    (digest is not None and cachedHash == digest)
+            if not fresh:
+                return None, cachedHash
+            columns = list(cached['__columns__'])
+            frame = pd.DataFrame({col: cached['c%d' % i] for i, col in enumerate(columns)})
+            return frame, cachedHash
+    except (OSError, KeyError, ValueError):
+        return None, None
+
+
+def writeCache(name, frame, stat, digest):
+    arrays = {}
+    for i, col in enumerate(frame.columns):
+        values = frame[col].to_numpy()
+        if values.dtype == object:
+            values = values.astype(str)
+        arrays['c%d' % i] = values
+    arrays['__columns__'] = np.array([str(col) for col in frame.columns])
+    arrays['__key__'] = np.array([stat.st_size, stat.st_mtime_ns], dtype=np.int64)
+    arrays['__hash__'] = np.array(digest)
+    try:
+        os.makedirs(cacheDir, exist_ok=True)
+        tmpPath = cachePath(name) + '.%d.tmp' % os.getpid()
+        with open(tmpPath, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(tmpPath, cachePath(name))
+    except OSError:
+        pass  # read-only slug: carry on without the cache
+
+
+def loadLocal(name):
+    import pandas as pd
+    path = os.path.join(dataDir, sources[name])
+    stat = os.stat(path)
+    frame, cachedHash = readCache(name, stat)
+    if frame is not None:
+        return frame, cachedHash
+
+    # mtime moved: only re-parse the CSV if the content actually changed
+    digest = fileHash(path)
+    if cachedHash == digest:
+        frame, _ = readCache(name, digest=digest)
+    if frame is None:
+        frame = pd.read_csv(path, header=0)
+    writeCache(name, frame, stat, digest)
+    return frame, digest
+
+
+def loadRemote(name):
+    import pandas as pd
+    with urllib.request.urlopen(remoteBaseUrl + sources[name], timeout=30) as response:
+        raw = response.read()
+    return pd.read_csv(io.BytesIO(raw), header=0), hashlib.sha1(raw).hexdigest()
+
+
+def loadFrame(name):
+    try:
+        if useRemote:
+            return loadRemote(name)
+        return loadLocal(name)
+    except (FileNotFoundError, urllib.error.HTTPError) as error:
+        if name not in optionalSources or getattr(error, 'code', 404) != 404:
+            raise
+        return None, None
+
+
+# Every spreadsheet as a DataFrame plus the sha1 of each source; missing optional sources are left out of both
+def loadSources():
+    frames = {}
+    hashes = {}
+    for name in sources:
+        frame, digest = loadFrame(name)
+        if frame is not None:
+            frames[name] = frame
+            hashes[name] = digest
+    return frames, hashes
+
+
+# Short version string that changes whenever any source changes
+def dataVersion(hashes):
+    return hashlib.sha1(''.join(hashes.values()).encode()).hexdigest()[:12]
+
+
+# Returns every spreadsheet as a DataFrame plus its data version
+def loadFrames():
+    frames, hashes = loadSources()
+    return frames, dataVersion(hashes)
+
+
+# Cheap change detector: (size, mtime) of every local source. Remote mode has nothing to stat, so it always reloads.
+def sourceSignature():
+    if useRemote:
+        return None
+    signature = []
+    for name in sources:
+        try:
+            stat = os.stat(os.path.join(dataDir, sources[name]))
+        except FileNotFoundError:
+            if name not in optionalSources:
+                raise
+            signature.append(None)
+            continue
+        signature.append((stat.st_size, stat.st_mtime_ns))
+    return tuple(signature)
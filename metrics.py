@@ -0,0 +1,231 @@
+import bisect
+import collections
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+import flask
+
+# METRICS
+# Per-route and per-callback latency, response sizes, build-stage timings, cache hit rates and data age, exposed in
+# the Prometheus text format on /metrics. Recording is a lock and a bisect per observation, cheap enough to leave on.
+# Set INDICATOR_PROFILER=1 to also enable /debug/profile?seconds=N, a sampling profiler that returns collapsed stacks
+# (the input format of flamegraph.pl and speedscope).
+
+latencyBuckets = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+sizeBuckets = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+profilerEnabled = os.environ.get('INDICATOR_PROFILER', '').lower() in {'1', 'true', 'yes'}
+profileInterval = 0.005
+maxProfileSeconds = 60
+
+
+def formatLabels(names, values):
+    if not names:
+        return ''
+    pairs = ('%s="%s"' % (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+             for name, value in zip(names, values))
+    return '{' + ','.join(pairs) + '}'
+
+
+class Histogram:
+
+    def __init__(self, name, documentation, labelNames, buckets=latencyBuckets):
+        self.name = name
+        self.documentation = documentation
+        self.labelNames = labelNames
+        self.buckets = buckets
+        self.series = {}  # label values -> [bucket counts..., +Inf count, sum]
+        self.lock = threading.Lock()
+
+    def observe(self, value, *labelValues):
+        i = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            counts = self.series.get(labelValues)
+            if counts is None:
+                counts = self.series[labelValues] = [0] * (len(self.buckets) + 2)
+            counts[i] += 1
+            counts[-1] += value
+
+    @contextmanager
+    def time(self, *labelValues):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labelValues)
+
+    def expose(self):
+        lines = ['# HELP %s %s' % (self.name, self.documentation), '# TYPE %s histogram' % self.name]
+        with self.lock:
+            series = sorted((labelValues, list(counts)) for labelValues, counts in self.series.items())
+        for labelValues, counts in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                labels = formatLabels(self.labelNames + ('le',), labelValues + (bound,))
+                lines.append('%s_bucket%s %d' % (self.name, labels, cumulative))
+            labels = formatLabels(self.labelNames, labelValues)
+            lines.append('%s_count%s %d' % (self.name, labels, cumulative))
+            lines.append('%s_sum%s %r' % (self.name, labels, counts[-1]))
+        return lines
+
+
+# Values read at scrape time: collect() returns [(label values, value)]
+class Collector:
+
+    def __init__(self, name, documentation, metricType, labelNames, collect):
+        self.name = name
+        self.documentation = documentation
+        self.metricType = metricType
+        self.labelNames = labelNames
+        self.collect = collect
+
+    def expose(self):
+        lines = ['# HELP %s %s' % (self.name, self.documentation), '# TYPE %s %s' % (self.name, self.metricType)]
+        for labelValues, value in self.collect():
+            if value is not None:
+                lines.append('%s%s %r' % (self.name, formatLabels(self.labelNames, labelValues), value))
+        return lines
+
+
+requestSeconds = Histogram('indicator_request_seconds', 'Time to handle a request, by route.',
+                           ('route', 'method', 'status'))
+callbackSeconds = Histogram('indicator_callback_seconds', 'Time to answer a Dash callback, by output.', ('output',))
+responseBytes = Histogram('indicator_response_bytes', 'Response body size as sent, by route.', ('route',),
+                          sizeBuckets)
+stageSeconds = Histogram('indicator_stage_seconds', 'Time spent in a data or figure build stage.', ('stage',))
+
+# Outputs of the registered Dash callbacks (app.callback_map, filled by app.createApp). The output of a callback
+# request comes from the client, so anything else is counted as 'unknown' to keep the label set bounded.
+callbackOutputs = set()
+
+# name -> LRUCache, see registerCache
+caches = {}
+
+
+def registerCache(name, cache):
+    caches[name] = cache
+    return cache
+
+
+def timed(stage):
+    return stageSeconds.time(stage)
+
+
+def snapshotStats():
+    import snapshot
+    snap = snapshot.current
+    if snap is None:
+        return []
+    return [(('age',), time.time() - snap.loadedAt), (('loaded_at',), snap.loadedAt)]
+
+
+def memoryStats():
+    import snapshot
+    return [((kind,), value) for kind, value in sorted(snapshot.memoryUsage().items())]
+
+
+collectors = [
+    Collector('indicator_cache_hits_total', 'Cache lookups that found an entry.', 'counter', ('cache',),
+              lambda: [((name,), cache.hits) for name, cache in sorted(caches.items())]),
+    Collector('indicator_cache_misses_total', 'Cache lookups that had to build the entry.', 'counter', ('cache',),
+              lambda: [((name,), cache.misses) for name, cache in sorted(caches.items())]),
+    Collector('indicator_cache_entries', 'Entries held by a cache.', 'gauge', ('cache',),
+              lambda: [((name,), len(cache)) for name, cache in sorted(caches.items())]),
+    Collector('indicator_cache_bytes', 'Bytes held by a cache that measures its entries.', 'gauge', ('cache',),
+              lambda: [((name,), cache.nbytes) for name, cache in sorted(caches.items())
+                       if cache.sizeOf is not None]),
+    Collector('indicator_snapshot_seconds', 'Age of the live data snapshot and the time it was loaded.', 'gauge',
+              ('kind',), snapshotStats),
+    Collector('indicator_process_memory_bytes', 'Memory of this process (rss, pss, shared, private).', 'gauge',
+              ('kind',), memoryStats),
+]
+
+histograms = [requestSeconds, callbackSeconds, responseBytes, stageSeconds]
+
+
+def expose():
+    lines = []
+    for metric in histograms + collectors:
+        lines.extend(metric.expose())
+    return '\n'.join(lines) + '\n'
+
+
+# REQUEST HOOKS
+
+callbackPath = '/_dash-update-component'
+
+
+def startTimer():
+    flask.g.metricsStart = time.perf_counter()
+
+
+def recordRequest(response):
+    start = flask.g.pop('metricsStart', None)
+    if start is None:
+        return response
+    seconds = time.perf_counter() - start
+    rule = flask.request.url_rule
+    route = rule.rule if rule is not None else 'unmatched'
+    requestSeconds.observe(seconds, route, flask.request.method, response.status_code)
+    if flask.request.path.endswith(callbackPath):
+        output = (flask.request.get_json(silent=True) or {}).get('output')
+        callbackSeconds.observe(seconds, output if output in callbackOutputs else 'unknown')
+    if response.content_length is not None:
+        responseBytes.observe(response.content_length, route)
+    return response
+
+
+# SAMPLING PROFILER
+
+profileLock = threading.Lock()
+
+
+def frameName(frame):
+    code = frame.f_code
+    return '%s (%s:%d)' % (code.co_name, os.path.basename(code.co_filename), code.co_firstlineno)
+
+
+# Samples the stacks of every other thread for `seconds` and returns them collapsed, one 'a;b;c count' line per stack
+def sampleStacks(seconds):
+    counts = collections.Counter()
+    me = threading.get_ident()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(frameName(frame))
+                frame = frame.f_back
+            counts[';'.join(reversed(stack))] += 1
+        time.sleep(profileInterval)
+    return '\n'.join('%s %d' % (stack, count) for stack, count in counts.most_common()) + '\n'
+
+
+def serveMetrics():
+    return flask.Response(expose(), mimetype='text/plain', headers={'Cache-Control': 'no-store'})
+
+
+def serveProfile():
+    seconds = min(flask.request.args.get('seconds', 10, type=float), maxProfileSeconds)
+    if not profileLock.acquire(blocking=False):
+        return flask.Response('a profile is already running\n', status=409, mimetype='text/plain')
+    try:
+        return flask.Response(sampleStacks(seconds), mimetype='text/plain', headers={'Cache-Control': 'no-store'})
+    finally:
+        profileLock.release()
+
+
+# Call before registering other hooks: the timer then starts first and the response is measured after
+# compression and the other after_request hooks have run
+def init(server):
+    server.before_request(startTimer)
+    server.after_request(recordRequest)
+    server.add_url_rule('/metrics', 'metrics', serveMetrics)
+    if profilerEnabled:
+        server.add_url_rule('/debug/profile', 'profile', serveProfile)
@@ -0,0 +1,55 @@
+import hashlib
+import json
+import os
+from collections import namedtuple
+
+import flask
+from plotly.utils import PlotlyJSONEncoder
+
+import compression
+import metrics
+from cache import LRUCache
+
+# A serialized JSON body and its strong ETag. Bodies are built once per data version and reused for every request;
+# `encoded` holds the brotli/gzip variants, each compressed the first time a client asks for it.
+Payload = namedtuple('Payload', ['body', 'etag', 'encoded'])
+
+# Bounded by entries and by the size of the bodies, since memoized callback responses can be numerous
+payloadCacheBytes = int(os.environ.get('INDICATOR_PAYLOAD_CACHE_BYTES', 32 * 1024 * 1024))
+payloadCache = metrics.registerCache('payloads', LRUCache(maxEntries=256, maxBytes=payloadCacheBytes,
+                                                          sizeOf=lambda payload: len(payload.body)))
+
+# Browsers may keep the payload but must revalidate it, which costs a 304 instead of a full body
+cacheControl = 'no-cache'
+
+
+def serialize(obj):
+    with metrics.timed('serialize'):
+        body = json.dumps(obj, cls=PlotlyJSONEncoder, separators=(',', ':')).encode('utf-8')
+    return Payload(body, hashlib.sha1(body).hexdigest()[:24], {})
+
+
+def getPayload(key, build):
+    return payloadCache.getOrBuild(key, lambda: serialize(build()))
+
+
+def encodedBody(payload, encoding):
+    if encoding not in payload.encoded:
+        payload.encoded[encoding] = compression.encode(payload.body, encoding)
+    return payload.encoded[encoding]
+
+
+def respond(payload, conditional=True):
+    encoding = compression.negotiate() if len(payload.body) >= compression.minSize else None
+    etag = compression.encodedTag(payload.etag, encoding)
+    if conditional and flask.request.if_none_match.contains(etag):
+        response = flask.Response(status=304)
+    elif encoding is None:
+        response = flask.Response(payload.body, mimetype='application/json')
+    else:
+        response = flask.Response(encodedBody(payload, encoding), mimetype='application/json')
+        response.headers['Content-Encoding'] = encoding
+    response.set_etag(etag)
+    response.vary.add('Accept-Encoding')
+    response.headers['Cache-Control'] = cacheControl
+    return response
@@ -0,0 +1,292 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import claims
+import loader
+import sectors
+import store
+
+logger = logging.getLogger(__name__)
+
+# DATA PIPELINE
+# Builds typed arrays from the CSVs in data/ (as written by ingest.py) through an explicit dependency graph:
+#   raw files -> cleaned level series (one per series/sector/state, Other Services' two exports merged, helper
+#   columns such as in_millions dropped) -> derived series (1M/12M changes, GDP percent change) and sector tables.
+# Every output is an uncompressed .npz in data/build/ that numpy reads without parsing. A stage is only rebuilt when
+# the hash of its inputs changed, and the stages of one level of the graph run in parallel on a process pool:
+#   python pipeline.py [--workers N] [--force]
+# The manifest records the size/mtime of every raw file it was built from; while those match the files in data/,
+# the app loads its store, sector cube and state claims from the build and never parses a CSV (loadBuild).
+
+buildDir = os.environ.get('INDICATOR_BUILD_DIR', os.path.join(loader.dataDir, 'build'))
+manifestPath = os.path.join(buildDir, 'manifest.json')
+maxWorkers = int(os.environ.get('INDICATOR_PIPELINE_WORKERS', os.cpu_count() or 1))
+
+# bump when a stage's code changes, so every output is rebuilt
+pipelineVersion = 2
+
+rawPrefix = 'raw:'
+
+
+# STAGE FUNCTIONS
+# Module-level so a process pool can run them: each reads its input files, writes its output file and returns the
+# hash of what it wrote
+
+def readSeries(path):
+    with np.load(path, allow_pickle=False) as arrays:
+        return arrays['dates'], arrays['values']
+
+
+# Returns a hash of the arrays' contents (the .npz itself carries write times)
+def writeArrays(path, **arrays):
+    tmpPath = path + '.%d.tmp' % os.getpid()
+    with open(tmpPath, 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(tmpPath, path)
+    sha = hashlib.sha1()
+    for name in sorted(arrays):
+        sha.update(name.encode() + str(arrays[name].dtype).encode() + np.ascontiguousarray(arrays[name]).tobytes())
+    return sha.hexdigest()
+
+
+# Levels of one column, dated by period; with several raw files (re-exports of one series) the most recent export
+# wins and the others fill the dates it lacks
+def cleanSeries(inputs, output, column):
+    import pandas as pd
+    merged = None
+    frames = [pd.read_csv(path, header=0) for path in inputs]
+    for frame in sorted(frames, key=lambda frame: frame['Date'].iloc[-1], reverse=True):
+        levels = pd.Series(frame[column or frame.columns[1]].to_numpy(dtype=float),
+                           index=pd.to_datetime(frame['Date']).to_numpy().astype('datetime64[D]'))
+        levels = levels[~levels.index.duplicated(keep='last')].dropna()
+        merged = levels if merged is None else merged.combine_first(levels)
+    merged = merged.sort_index()
+    return writeArrays(output, dates=merged.index.to_numpy().astype('datetime64[D]'),
+                values=store.compactValues(merged.to_numpy()))
+
+
+# The first observations of a derived series need levels from before the file starts; a second input (the column
+# ingest.py published) fills those in
+def fillPublished(dates, values, inputs):
+    if len(inputs) > 1:
+        publishedDates, published = readSeries(inputs[1])
+        missing = np.flatnonzero(np.isnan(values) & np.isin(dates, publishedDates))
+        values[missing] = published[np.searchsorted(publishedDates, dates[missing])]
+    return values
+
+
+def lagChange(inputs, output, lag):
+    dates, values = readSeries(inputs[0])
+    values = values.astype(np.float64)
+    change = np.full(len(values), np.nan)
+    change[lag:] = values[lag:] - values[:-lag]
+    return writeArrays(output, dates=dates, values=store.compactValues(fillPublished(dates, change, inputs)))
+
+
+def percentChange(inputs, output, parameter=None):
+    dates, values = readSeries(inputs[0])
+    values = values.astype(np.float64)
+    change = np.full(len(values), np.nan)
+    change[1:] = (values[1:] / values[:-1] - 1) * 100
+    return writeArrays(output, dates=dates, values=fillPublished(dates, change, inputs))
+
+
+# Month axis and sector x month levels of (dates, values) series, as sectors.alignLevels makes from the files
+def alignSectors(series):
+    months = np.unique(np.concatenate([dates.astype('datetime64[M]') for dates, _ in series]))
+    levels = np.full((len(series), len(months)), np.nan)
+    for row, (dates, values) in enumerate(series):
+        levels[row, np.searchsorted(months, dates.astype('datetime64[M]'))] = values
+    return months, levels
+
+
+# Sector x month table of the change over `lag` months, in jobs, like the old jobsSector_MoM/MoY exports
+def sectorTable(inputs, output, lag):
+    months, levels = alignSectors([readSeries(path) for path in inputs])
+    change = np.full(levels.shape, np.nan)
+    change[:, lag:] = (levels[:, lag:] - levels[:, :-lag]) * sectors.levelScale
+    return writeArrays(output, months=months, labels=np.array(sectors.labels), values=change)
+
+
+# GRAPH
+# name -> (function, inputs, parameter): inputs are raw files ('raw:<path under data/>') or other stages
+Stage = namedtuple('Stage', ['function', 'inputs', 'parameter'])
+
+
+def raw(name):
+    return rawPrefix + loader.sources[name]
+
+
+def sectorStage(column, names):
+    return 'SECTOR_' + (column or names[0][len('sector_'):])
+
+
+stages = {
+    'ICSA': Stage(cleanSeries, [raw('fredICSA')], 'ICSA'),
+    'ICSA_HIST': Stage(cleanSeries, [raw('ICSA_historical')], 'ICSA'),
+    'CCSA': Stage(cleanSeries, [raw('fredCCSA')], 'CCSA'),
+    'UNRATE': Stage(cleanSeries, [raw('unemploymentRate')], 'Unemployment Rate'),
+    'U6RATE': Stage(cleanSeries, [raw('U6unemployment')], 'U6'),
+    'PAYEMS': Stage(cleanSeries, [raw('PayrollJobs')], 'Payroll Jobs'),
+    'PAYEMS_1M': Stage(lagChange, ['PAYEMS', 'PAYEMS_1M_PUBLISHED'], 1),
+    'PAYEMS_12M': Stage(lagChange, ['PAYEMS', 'PAYEMS_12M_PUBLISHED'], 12),
+    'GDP': Stage(cleanSeries, [raw('realGDP')], 'Real GDP'),
+    'GDP_PCT': Stage(percentChange, ['GDP', 'GDP_PCT_PUBLISHED'], None),
+    'PAYEMS_1M_PUBLISHED': Stage(cleanSeries, [raw('PayrollJobs')], '1M Change'),
+    'PAYEMS_12M_PUBLISHED': Stage(cleanSeries, [raw('PayrollJobs')], '12M Change'),
+    'GDP_PCT_PUBLISHED': Stage(cleanSeries, [raw('realGDP')], 'Percent Change'),
+}
+stages.update({sectorStage(column, names): Stage(cleanSeries, [raw(name) for name in names], column)
+               for names, column, _ in sectors.sectors})
+sectorStages = [sectorStage(column, names) for names, column, _ in sectors.sectors]
+stages['jobsSector_MoM'] = Stage(sectorTable, sectorStages, 1)
+stages['jobsSector_MoY'] = Stage(sectorTable, sectorStages, 12)
+
+# only the state files ingest.py has fetched so far
+stateStages = {'STATE_' + code: claims.sourceName(code) for code, _, _ in claims.states
+               if os.path.exists(os.path.join(loader.dataDir, loader.sources[claims.sourceName(code)]))}
+stages.update({stage: Stage(cleanSeries, [raw(name)], claims.column) for stage, name in stateStages.items()})
+
+
+def outputPath(name):
+    return os.path.join(buildDir, name + '.npz')
+
+
+def inputPath(item):
+    if item.startswith(rawPrefix):
+        return os.path.join(loader.dataDir, item[len(rawPrefix):])
+    return outputPath(item)
+
+
+# Stage names grouped so every stage comes after the stages it reads; the stages of one level are independent
+def levels():
+    depth = {}
+
+    def stageDepth(name):
+        if name not in depth:
+            depth[name] = 1 + max([stageDepth(item) for item in stages[name].inputs if item in stages] or [-1])
+        return depth[name]
+
+    grouped = {}
+    for name in stages:
+        grouped.setdefault(stageDepth(name), []).append(name)
+    return [grouped[level] for level in sorted(grouped)]
+
+
+def fileStat(path):
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def loadManifest():
+    try:
+        with open(manifestPath) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return manifest if manifest.get('pipelineVersion') == pipelineVersion else {}
+
+
+def saveManifest(manifest):
+    tmpPath = manifestPath + '.tmp'
+    with open(tmpPath, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmpPath, manifestPath)
+
+
+# Runs the stages whose inputs changed since the last run (every stage with force). Returns the names rebuilt.
+def run(workers=maxWorkers, force=False):
+    os.makedirs(buildDir, exist_ok=True)
+    previous = loadManifest()
+    oldStages = previous.get('stages', {})
+    rawHashes = {}
+    rawStats = {}
+    outputHashes = {}
+    manifest = {'pipelineVersion': pipelineVersion, 'raw': rawHashes, 'stats': rawStats, 'stages': {}}
+    rebuilt = []
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for level in levels():
+            pending = {}
+            for name in level:
+                stage = stages[name]
+                inputHashes = []
+                for item in stage.inputs:
+                    if item.startswith(rawPrefix):
+                        path = item[len(rawPrefix):]
+                        if path not in rawHashes:
+                            # stat first: a file written while it is hashed then no longer matches the build
+                            rawStats[path] = fileStat(inputPath(item))
+                            rawHashes[path] = loader.fileHash(inputPath(item))
+                        inputHashes.append(rawHashes[path])
+                    else:
+                        inputHashes.append(outputHashes[item])
+                key = hashlib.sha1(json.dumps([name, repr(stage.parameter), inputHashes]).encode()).hexdigest()
+                old = oldStages.get(name)
+                if not force and old and old['key'] == key and os.path.exists(outputPath(name)):
+                    manifest['stages'][name] = old
+                    outputHashes[name] = old['output']
+                    continue
+                pending[name] = (key, pool.submit(stage.function, [inputPath(item) for item in stage.inputs],
+                                                  outputPath(name), stage.parameter))
+            for name, (key, future) in pending.items():
+                outputHashes[name] = future.result()
+                manifest['stages'][name] = {'key': key, 'output': outputHashes[name]}
+                rebuilt.append(name)
+
+    saveManifest(manifest)
+    return rebuilt
+
+
+# LOADING
+# Everything a snapshot reads from the data files: the hashes of the files (as returned by loader.loadSources), the
+# store's series, the sector cube's months and levels, and the state claims (None without state files)
+Build = namedtuple('Build', ['hashes', 'store', 'sectorMonths', 'sectorLevels', 'stateClaims'])
+
+
+# The build, read without parsing, or None unless it was made from exactly the files now in data/ (same sources,
+# same size/mtime); the caller then parses the CSVs
+def loadBuild():
+    if loader.useRemote:
+        return None
+    manifest = loadManifest()
+    current = {}
+    for path in loader.sources.values():
+        try:
+            current[path] = fileStat(os.path.join(loader.dataDir, path))
+        except FileNotFoundError:
+            continue
+    if not manifest or manifest['stats'] != current:
+        return None
+    try:
+        arrays = {seriesId: readSeries(outputPath(seriesId)) for seriesId in store.definitions}
+        sectorMonths, sectorLevels = alignSectors([readSeries(outputPath(stage)) for stage in sectorStages])
+        states = [(code, readSeries(outputPath('STATE_' + code))) for code, _, _ in claims.states
+                  if loader.sources[claims.sourceName(code)] in current]
+    except (OSError, KeyError, ValueError):
+        return None
+    hashes = {name: manifest['raw'][path] for name, path in loader.sources.items() if path in current}
+    stateClaims = claims.StateClaims.fromSeries([code for code, _ in states], [dates for _, (dates, _) in states],
+                                                [values for _, (_, values) in states])
+    return Build(hashes, store.SeriesStore.fromArrays(arrays), sectorMonths, sectorLevels, stateClaims)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the typed arrays in data/build/ from the CSVs in data/')
+    parser.add_argument('--workers', type=int, default=maxWorkers, help='processes (default: one per CPU)')
+    parser.add_argument('--force', action='store_true', help='rebuild every stage')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s %(message)s')
+
+    start = time.perf_counter()
+    rebuilt = run(args.workers, args.force)
+    print('rebuilt %d of %d stages in %.2fs: %s' % (len(rebuilt), len(stages), time.perf_counter() - start,
+                                                    ', '.join(rebuilt) or '-'))
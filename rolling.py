@@ -0,0 +1,134 @@
+import numpy as np
+
+from store import Series
+
+# ROLLING STATISTICS
+# id -> (source series id in the store, statistic, window in observations of the source)
+#   mean    trailing mean of the last `window` observations, the current one included
+#   change  difference from the observation `window` steps back (52 weeks back is year over year)
+#   zscore  distance of the current observation from the mean of the `window` before it, in standard deviations
+definitions = {
+    'ICSA_4WK': ('ICSA_HIST', 'mean', 4),
+    'ICSA_YOY': ('ICSA_HIST', 'change', 52),
+    'ICSA_Z52': ('ICSA_HIST', 'zscore', 52),
+    'PAYEMS_1M_3MA': ('PAYEMS_1M', 'mean', 3),
+    'PAYEMS_1M_Z24': ('PAYEMS_1M', 'zscore', 24),
+}
+
+# RECESSION ANALOGS
+# id -> (source, start of a past recession, start of the current one, weeks): the past recession's observations
+# re-dated so its first week lines up with the current recession's, for overlaying the two
+analogs = {
+    'ICSA_2008_ANALOG': ('ICSA_HIST', '2007-12-01', '2020-02-01', 104),
+}
+
+
+# Sums, sums of squares and finite counts of the `window` observations ending at each index (fewer at the start)
+def trailingSums(values, window):
+    finite = np.isfinite(values)
+    clean = np.where(finite, values, 0)
+    sums = []
+    for column in (clean, clean * clean, finite.astype(np.int64)):
+        total = np.concatenate([[0], np.cumsum(column)])
+        sums.append(total[1:] - total[np.maximum(np.arange(1, len(column) + 1) - window, 0)])
+    return sums
+
+
+def zscores(values, means, squareMeans):
+    std = np.sqrt(np.maximum(squareMeans - means * means, 0))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(std > 0, (values - means) / std, np.nan)
+
+
+# The statistic over a whole series at once, for the initial backfill
+def backfill(values, statistic, window):
+    values = np.asarray(values, dtype=np.float64)
+    result = np.full(len(values), np.nan)
+    if statistic == 'change':
+        result[window:] = values[window:] - values[:-window]
+        return result
+    sums, squares, counts = trailingSums(values, window)
+    if statistic == 'mean':
+        full = counts == window
+        result[full] = sums[full] / window
+    else:
+        # the window before each observation ends at the previous index
+        full = counts[window - 1:-1] == window
+        means = sums[window - 1:-1] / window
+        scores = zscores(values[window:], means, squares[window - 1:-1] / window)
+        result[window:] = np.where(full, scores, np.nan)
+    return result
+
+
+# The statistic for one new observation, from the observations before it; O(window)
+def latest(previous, value, statistic, window):
+    if statistic == 'change':
+        return value - previous[-window] if len(previous) >= window else np.nan
+    if statistic == 'mean':
+        recent = np.append(previous[len(previous) - (window - 1):] if window > 1 else [], value)
+        return recent.mean() if len(recent) == window and np.isfinite(recent).all() else np.nan
+    recent = previous[-window:]
+    if len(recent) < window or not np.isfinite(recent).all():
+        return np.nan
+    return float(zscores(value, recent.mean(), (recent * recent).mean()))
+
+
+# Rolling statistics of the store's series. Each output is a buffer with spare capacity like SectorEngine's cube:
+# observations appended to a source are computed one at a time from the last `window` source values and written
+# past the end of the buffer, so an engine that is already in use never sees its data change.
+class RollingEngine:
+
+    def __init__(self, outputs, sources, lengths):
+        self.outputs = outputs
+        self.sources = sources
+        self.lengths = lengths
+
+    @classmethod
+    def fromStore(cls, store):
+        outputs, sources, lengths = {}, {}, {}
+        for seriesId, (source, statistic, window) in definitions.items():
+            values = store[source].values
+            outputs[seriesId] = np.concatenate([backfill(values, statistic, window), np.full(52, np.nan)])
+            sources[source], lengths[source] = values, len(values)
+        return cls(outputs, sources, lengths)
+
+    # Picks up new data: observations appended to a source are computed incrementally, anything else is a rebuild
+    def updated(self, store):
+        for source, consumed in self.sources.items():
+            values, n = store[source].values, self.lengths[source]
+            if len(values) < n or not np.array_equal(values[:n].astype(np.float64), consumed[:n].astype(np.float64),
+                                                     equal_nan=True):
+                return RollingEngine.fromStore(store)
+
+        outputs = dict(self.outputs)
+        sources, lengths = {}, {}
+        for seriesId, (source, statistic, window) in definitions.items():
+            values = store[source].values.astype(np.float64)
+            n = self.lengths[source]
+            buffer = outputs[seriesId]
+            if len(values) > len(buffer):
+                buffer = np.concatenate([buffer, np.full(max(52, len(values) - len(buffer)), np.nan)])
+            for i in range(n, len(values)):
+                buffer[i] = latest(values[max(i - window, 0):i], values[i], statistic, window)
+            outputs[seriesId] = buffer
+            sources[source], lengths[source] = store[source].values, len(values)
+        return RollingEngine(outputs, sources, lengths)
+
+    # The rolling statistics and recession analogs as store series, dated like their sources
+    def series(self, store):
+        series = {}
+        for seriesId, (source, _, _) in definitions.items():
+            dates = store[source].dates
+            series[seriesId] = Series(seriesId, dates, self.outputs[seriesId][:len(dates)], store[source].freq)
+        for seriesId, (source, past, current, weeks) in analogs.items():
+            series[seriesId] = analogSeries(seriesId, store[source], past, current, weeks)
+        return series
+
+
+def analogSeries(seriesId, source, past, current, weeks):
+    start = int(np.searchsorted(source.dates, np.datetime64(past, 'D')))
+    # whole weeks, so the shifted dates keep the source's weekday
+    days = (np.datetime64(current, 'D') - np.datetime64(past, 'D')).astype(np.int64)
+    offset = np.timedelta64(int(round(days / 7)) * 7, 'D')
+    return Series(seriesId, source.dates[start:start + weeks] + offset, source.values[start:start + weeks],
+                  source.freq)
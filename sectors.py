@@ -0,0 +1,150 @@
+import numpy as np
+
+# SECTORS
+# (source name(s) in loader.sources, level column, label), in the order the sector charts list them.
+# Other Services was exported twice (otherServices.csv and the misspelled otherServies.csv); both are read and the
+# most recent export wins, with the other only filling months it lacks.
+sectors = [
+    (['sector_federalGovt'], 'federalGovt', 'Federal Govt'),
+    (['sector_educationHealth'], 'educationHealth', 'Education & Health Services'),
+    (['sector_profBusServ'], 'profBusServ', 'Professional Business Services'),
+    (['sector_leisureHosp'], 'leisureHosp', 'Leisure & Hospitality'),
+    (['sector_retailTrade'], 'retailTrade', 'Retail Trade'),
+    (['sector_manufacturing'], 'mfg', 'Manufacturing'),
+    (['sector_financial'], 'financial', 'Financial'),
+    (['sector_construction'], 'construction', 'Construction'),
+    (['sector_wholesaleTrade'], 'wholesaleTrade', 'Wholesale Trade'),
+    (['sector_otherServices', 'sector_otherServies'], None, 'Other Services'),
+    (['sector_transportation'], 'transportation', 'Transportation'),
+    (['sector_information'], 'information', 'Information'),
+]
+
+labels = [label for _, _, label in sectors]
+
+# the files are in thousands of jobs
+levelScale = 1000
+
+# metric axis of the cube
+metrics = ['level', '1M', '12M', '1M %', '12M %']
+LEVEL, CHANGE_1M, CHANGE_12M, PERCENT_1M, PERCENT_12M = range(len(metrics))
+metricLabels = {'level': 'Jobs', '1M': '1 month change', '12M': '12 month change', '1M %': '1 month % change',
+                '12M %': '12 month % change'}
+percentMetrics = {'1M %', '12M %'}
+changes = [(1, CHANGE_1M, PERCENT_1M), (12, CHANGE_12M, PERCENT_12M)]
+
+
+def sectorLevels(frames, names, column):
+    import pandas as pd
+    merged = None
+    candidates = sorted((frames[name] for name in names), key=lambda frame: frame['Date'].iloc[-1], reverse=True)
+    for frame in candidates:
+        levels = pd.Series(frame[column or frame.columns[1]].to_numpy(), index=frame['Date'].to_numpy())
+        merged = levels if merged is None else merged.combine_first(levels)
+    return merged
+
+
+# Month axis and sector x month level array of every sector file
+def alignLevels(frames):
+    series = [sectorLevels(frames, names, column) for names, column, _ in sectors]
+    monthIndex = sorted(set().union(*(levels.index for levels in series)))
+    levels = np.vstack([levels.reindex(monthIndex).to_numpy(dtype=float) for levels in series])
+    return np.array(monthIndex, dtype='datetime64[M]'), levels
+
+
+# Fills metric columns [start, stop) of a sector x month cube from its level row, all sectors at once
+def computeColumns(cube, start, stop):
+    levels = cube[LEVEL]
+    for lag, change, percent in changes:
+        lo = max(start, lag)
+        if lo < stop:
+            previous = levels[:, lo - lag:stop - lag]
+            cube[change, :, lo:stop] = levels[:, lo:stop] - previous
+            with np.errstate(divide='ignore', invalid='ignore'):
+                cube[percent, :, lo:stop] = (levels[:, lo:stop] / previous - 1) * 100
+
+
+# Rank 1 is the largest value of the month; missing values rank last
+def rankColumns(values):
+    order = np.argsort(np.where(np.isnan(values), np.inf, -values), axis=0, kind='stable')
+    ranks = np.empty_like(order)
+    np.put_along_axis(ranks, order, np.arange(1, values.shape[0] + 1)[:, None], axis=0)
+    return ranks
+
+
+# Level series of every sector aligned on one month axis, with 1M/12M changes, percent changes and ranks.
+# Columns past `length` are spare capacity: appending a month fills the next column of the shared buffers and
+# returns a new engine, so an engine that is already in use never sees its data change.
+class SectorEngine:
+
+    def __init__(self, months, cube, ranks, length):
+        self.months = months
+        self.cube = cube
+        self.ranks = ranks
+        self.length = length
+
+    @classmethod
+    def fromFrames(cls, frames):
+        return cls.fromLevels(*alignLevels(frames))
+
+    @classmethod
+    def fromLevels(cls, months, levels):
+        capacity = len(months) + 12
+        cube = np.full((len(metrics), len(sectors), capacity), np.nan)
+        cube[LEVEL, :, :len(months)] = levels
+        computeColumns(cube, 0, len(months))
+        ranks = np.zeros((len(metrics), len(sectors), capacity), dtype=np.int16)
+        for metric in range(len(metrics)):
+            ranks[metric, :, :len(months)] = rankColumns(cube[metric, :, :len(months)])
+        return cls(np.concatenate([months, np.zeros(capacity - len(months), dtype='datetime64[M]')]),
+                   cube, ranks, len(months))
+
+    def appended(self, month, levels):
+        months, cube, ranks = self.months, self.cube, self.ranks
+        if self.length == cube.shape[2]:
+            grow = max(12, self.length)
+            months = np.concatenate([months, np.zeros(grow, dtype='datetime64[M]')])
+            cube = np.concatenate([cube, np.full(cube.shape[:2] + (grow,), np.nan)], axis=2)
+            ranks = np.concatenate([ranks, np.zeros(ranks.shape[:2] + (grow,), dtype=ranks.dtype)], axis=2)
+        i = self.length
+        months[i] = np.datetime64(month, 'M')
+        cube[:, :, i] = np.nan
+        cube[LEVEL, :, i] = levels
+        computeColumns(cube, i, i + 1)
+        ranks[:, :, i] = rankColumns(cube[:, :, i].T).T
+        return SectorEngine(months, cube, ranks, i + 1)
+
+    # Picks up new data (as alignLevels returns it): months appended to the end are computed incrementally,
+    # anything else is a rebuild
+    def updated(self, months, levels):
+        n = self.length
+        if len(months) < n or not np.array_equal(months[:n], self.months[:n]) or \
+                not np.array_equal(levels[:, :n], self.cube[LEVEL, :, :n], equal_nan=True):
+            return SectorEngine.fromLevels(months, levels)
+        engine = self
+        for i in range(n, len(months)):
+            engine = engine.appended(months[i], levels[:, i])
+        return engine
+
+    def monthLabels(self):
+        return np.datetime_as_string(self.months[:self.length], unit='M')
+
+    def monthIndex(self, month=None):
+        if month is None:
+            return self.length - 1
+        return int(np.searchsorted(self.months[:self.length], np.datetime64(month, 'M')))
+
+    def values(self, metric, month=None):
+        return self.cube[metrics.index(metric), :, self.monthIndex(month)]
+
+    def ranking(self, metric, month=None):
+        return self.ranks[metrics.index(metric), :, self.monthIndex(month)]
+
+    # Month axis and the metric of the given sector rows over every month (a sector x month view of the cube)
+    def history(self, metric, rows):
+        return self.months[:self.length], self.cube[metrics.index(metric), rows, :self.length]
+
+    # Wide sector x month table of one metric, in the layout of the old jobsSector_MoM/MoY exports
+    def table(self, metric):
+        import pandas as pd
+        return pd.DataFrame(self.cube[metrics.index(metric), :, :self.length], index=labels,
+                            columns=self.monthLabels())
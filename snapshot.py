@@ -0,0 +1,197 @@
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+from datetime import date
+
+import numpy as np
+
+import loader
+import metrics
+import pipeline
+import vintages
+from claims import StateClaims
+from rolling import RollingEngine
+from sectors import SectorEngine, alignLevels
+from store import SeriesStore
+
+logger = logging.getLogger(__name__)
+
+# Everything a request needs, loaded and derived together. A snapshot is never modified after it is built;
+# a refresh builds a new one and swaps the module-level reference, so a request that grabbed a snapshot
+# keeps seeing one consistent version of the data.
+Snapshot = namedtuple('Snapshot', ['version', 'signature', 'store', 'sectors', 'stateClaims', 'rolling', 'vintages',
+                                   'kpis', 'loadedAt'])
+
+# Seconds between checks of the data files (0 disables the background refresh)
+refreshInterval = float(os.environ.get('INDICATOR_REFRESH_SECONDS', 300))
+
+# Set by gunicorn.conf.py in preload mode: the master only loads data, each worker starts its own refresh thread
+schedulerDeferred = os.environ.get('INDICATOR_DEFER_SCHEDULER') == '1'
+
+# Called with a new snapshot before it goes live, so figures/payloads are warmed off the request path
+warmers = []
+
+current = None
+swapLock = threading.Lock()
+
+
+# 'November 2020' style name of a datetime64 month
+def monthName(month, pattern='%B %Y'):
+    return month.astype('datetime64[M]').astype('datetime64[D]').item().strftime(pattern)
+
+
+def computeKpis(store, sectors):
+    # latest published observation of each series, rather than dates derived from today's weekday
+    today = date.today()
+    totalInitialClaims = round(store['ICSA'].values.sum() / 1000000, 1)
+    lastWeekClaims = round(store['ICSA'].asOf(today)[1] / 1000000, 2) * 1000
+    totalContinuedClaims = round(store['CCSA'].asOf(today)[1] / 1000000, 1)
+    unempRateDate, currentUnempRate = store['UNRATE'].asOf(today)
+    sectorMonth = np.datetime64(sectors.monthLabels()[-1], 'M')
+
+    return {'totalInitialClaims': totalInitialClaims,
+            'lastWeekClaims': lastWeekClaims,
+            'totalContinuedClaims': totalContinuedClaims,
+            'currentUnempRate': currentUnempRate,
+            'unempRateMonth': monthName(unempRateDate),
+            'sectorMonth': str(sectorMonth),
+            'sectorMonthName': monthName(sectorMonth),
+            'sectorMonthShort': monthName(sectorMonth, '%b %Y'),
+            'sectorYearAgoShort': monthName(sectorMonth - 12, '%b %Y')}
+
+
+def rssBytes():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+# rss plus, where the kernel reports it, pss (shared pages divided among the processes sharing them) and the
+# shared/private split, in bytes. Summing pss over the gunicorn workers gives their real footprint.
+def memoryUsage():
+    usage = {'rss': rssBytes()}
+    fields = {'Pss:': 'pss', 'Shared_Clean:': 'shared', 'Shared_Dirty:': 'shared',
+              'Private_Clean:': 'private', 'Private_Dirty:': 'private'}
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            for line in f:
+                parts = line.split()
+                if parts and parts[0] in fields:
+                    key = fields[parts[0]]
+                    usage[key] = usage.get(key, 0) + int(parts[1]) * 1024
+    except OSError:
+        pass
+    return usage
+
+
+# The data files plus the vintage logs, which can grow without any file in data/ changing
+def sourceSignature():
+    signature = loader.sourceSignature()
+    return None if signature is None else (signature, vintages.signature())
+
+
+# Fallback when there is no up-to-date pipeline build: parses the spreadsheets (through loader's parse cache) into
+# what the build would hold. The DataFrames are dropped once the store, sector levels and state claims are made.
+def parseSources():
+    frames, hashes = loader.loadSources()
+    return pipeline.Build(hashes, SeriesStore.fromFrames(frames), *alignLevels(frames), StateClaims.fromFrames(frames))
+
+
+def build(previous=None):
+    rssBefore = rssBytes()
+    signature = sourceSignature()
+    with metrics.timed('load'):
+        # the pipeline's typed arrays when `python pipeline.py` ran on exactly these files, else the spreadsheets
+        data = pipeline.loadBuild() or parseSources()
+    with metrics.timed('vintages'):
+        # None until a release has been recorded
+        vintageStore = vintages.VintageStore.load()
+    hashes = data.hashes if vintageStore is None else dict(data.hashes, vintages=vintageStore.digest)
+    version = loader.dataVersion(hashes)
+    store = data.store
+    with metrics.timed('rolling'):
+        # new observations are appended to the previous engine's statistics instead of recomputing the history
+        rolling = previous.rolling.updated(store) if previous is not None else RollingEngine.fromStore(store)
+        store = store.withSeries(rolling.series(store))
+    with metrics.timed('sectors'):
+        # new sector months are appended to the previous engine instead of recomputing every month
+        sectors = previous.sectors.updated(data.sectorMonths, data.sectorLevels) if previous is not None else \
+            SectorEngine.fromLevels(data.sectorMonths, data.sectorLevels)
+    stateClaims = data.stateClaims
+    with metrics.timed('kpis'):
+        kpis = computeKpis(store, sectors)
+    snap = Snapshot(version, signature, store, sectors, stateClaims, rolling, vintageStore, kpis, time.time())
+    rssAfter = rssBytes()
+    if rssAfter is not None:
+        logger.info('snapshot %s: store %.1f kB, rss %.1f -> %.1f MB', version, store.nbytes / 1024,
+                    rssBefore / 1048576, rssAfter / 1048576)
+    return snap
+
+
+def get():
+    global current
+    if current is None:
+        with swapLock:
+            if current is None:
+                snap = build()
+                for warm in warmers:
+                    warm(snap)
+                current = snap
+    return current
+
+
+# Reloads the data if any source changed; the new snapshot is fully built and warmed before it replaces the old one
+def refresh():
+    global current
+    old = get()
+    if old.signature is not None and sourceSignature() == old.signature:
+        return False
+    snap = build(old)
+    if snap.version == old.version:
+        current = old._replace(signature=snap.signature)
+        return False
+    for warm in warmers:
+        warm(snap)
+    with swapLock:
+        current = snap
+    logger.info('data snapshot %s -> %s', old.version, snap.version)
+    return True
+
+
+class RefreshScheduler(threading.Thread):
+
+    def __init__(self, interval=refreshInterval):
+        super().__init__(name='data-refresh', daemon=True)
+        self.interval = interval
+        self.pid = os.getpid()
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                refresh()
+            except Exception:
+                # keep serving the last good snapshot; try again next interval
+                logger.exception('data refresh failed')
+
+    def stop(self):
+        self.stopped.set()
+
+
+scheduler = None
+
+
+# Threads do not survive a fork, so a forked worker starts its own
+def startScheduler():
+    global scheduler
+    if refreshInterval > 0 and (scheduler is None or scheduler.pid != os.getpid()):
+        scheduler = RefreshScheduler()
+        scheduler.start()
+    return scheduler
@@ -0,0 +1,182 @@
+import numpy as np
+
+# SERIES
+# id -> (spreadsheet in loader.sources, column). Every chart and KPI reads its data through these ids.
+definitions = {
+    'ICSA': ('fredICSA', 'ICSA'),
+    'ICSA_HIST': ('ICSA_historical', 'ICSA'),
+    'CCSA': ('fredCCSA', 'CCSA'),
+    'UNRATE': ('unemploymentRate', 'Unemployment Rate'),
+    'U6RATE': ('U6unemployment', 'U6'),
+    'PAYEMS': ('PayrollJobs', 'Payroll Jobs'),
+    'PAYEMS_1M': ('PayrollJobs', '1M Change'),
+    'PAYEMS_12M': ('PayrollJobs', '12M Change'),
+    'GDP': ('realGDP', 'Real GDP'),
+    'GDP_PCT': ('realGDP', 'Percent Change'),
+}
+
+# median spacing in days -> frequency code
+frequencies = [(1, 'D'), (7, 'W'), (31, 'M'), (92, 'Q'), (366, 'A')]
+frequencyOrder = [code for _, code in frequencies]
+
+# how observations inside one period are combined when resampling
+aggregations = {
+    'last': lambda values, starts: values[np.r_[starts[1:], len(values)] - 1],
+    'first': lambda values, starts: values[starts],
+    'sum': lambda values, starts: np.add.reduceat(values, starts),
+    'mean': lambda values, starts: np.add.reduceat(values, starts) / np.diff(np.r_[starts, len(values)]),
+    'max': lambda values, starts: np.maximum.reduceat(values, starts),
+    'min': lambda values, starts: np.minimum.reduceat(values, starts),
+}
+
+
+# Date each observation's period is labelled with: the period start, except weeks, which are labelled with their
+# ending Saturday like the claims data (1970-01-03, day 2 of the epoch, was a Saturday)
+def periodLabels(dates, freq):
+    if freq == 'D':
+        return dates
+    if freq == 'W':
+        return dates + (2 - dates.astype(np.int64)) % 7
+    months = dates.astype('datetime64[M]')
+    if freq == 'Q':
+        months = months - months.astype(np.int64) % 3
+    elif freq == 'A':
+        months = dates.astype('datetime64[Y]').astype('datetime64[M]')
+    return months.astype('datetime64[D]')
+
+
+# Smallest dtype that holds the values exactly: int32 for whole counts, float32 when it round-trips, else float64
+def compactValues(values):
+    values = np.asarray(values, dtype=np.float64)
+    finite = np.isfinite(values)
+    if finite.all() and np.array_equal(values, np.round(values)) and \
+            (len(values) == 0 or np.abs(values).max() < np.iinfo(np.int32).max):
+        return values.astype(np.int32)
+    single = values.astype(np.float32)
+    if np.array_equal(single.astype(np.float64), values, equal_nan=True):
+        return single
+    return values
+
+
+# DATE RANGES
+# (start, end) with each an ISO date or None for an open end. Ranges are normalized so equal ranges are equal cache
+# keys; fullRange is every observation.
+fullRange = (None, None)
+
+
+def dateRange(start=None, end=None):
+    bounds = tuple(None if value in (None, '') else str(np.datetime64(str(value)[:10], 'D')) for value in (start, end))
+    if None not in bounds and bounds[0] > bounds[1]:
+        raise ValueError('start %s is after end %s' % bounds)
+    return bounds
+
+
+# Indices lo, hi of the sorted dates with start <= date <= end, by binary search
+def rangeBounds(dates, start=None, end=None):
+    lo = 0 if start is None else int(np.searchsorted(dates, np.datetime64(start, 'D'), side='left'))
+    hi = len(dates) if end is None else int(np.searchsorted(dates, np.datetime64(end, 'D'), side='right'))
+    return lo, hi
+
+
+def inferFrequency(dates):
+    if len(dates) < 2:
+        return None
+    spacing = np.median(np.diff(dates).astype(np.int64))
+    for days, code in frequencies:
+        if spacing <= days:
+            return code
+    return 'A'
+
+
+# One observation series: sorted datetime64[D] dates and a compactly typed value array of the same length.
+# Slices are views into the parent arrays; nothing is copied.
+class Series:
+
+    def __init__(self, seriesId, dates, values, freq):
+        self.seriesId = seriesId
+        self.dates = dates
+        self.values = values
+        self.freq = freq
+
+    def __len__(self):
+        return len(self.dates)
+
+    @property
+    def nbytes(self):
+        return self.dates.nbytes + self.values.nbytes
+
+    def latest(self):
+        return self.dates[-1], self.values[-1]
+
+    # Latest observation on or before `day`, or None if the series starts later
+    def asOf(self, day):
+        i = int(np.searchsorted(self.dates, np.datetime64(day, 'D'), side='right')) - 1
+        if i < 0:
+            return None
+        return self.dates[i], self.values[i]
+
+    def bounds(self, start=None, end=None):
+        return rangeBounds(self.dates, start, end)
+
+    # Observations with start <= date <= end (either bound may be None)
+    def slice(self, start=None, end=None):
+        lo, hi = self.bounds(start, end)
+        return Series(self.seriesId, self.dates[lo:hi], self.values[lo:hi], self.freq)
+
+    # Same observations in arrays of their own, so a slice kept in a cache does not keep its parent alive
+    def copy(self):
+        return Series(self.seriesId, self.dates.copy(), self.values.copy(), self.freq)
+
+    # Same series at a coarser frequency, one observation per period (see periodLabels)
+    def resample(self, freq, how='last'):
+        if freq == self.freq or len(self.dates) == 0:
+            return self
+        if frequencyOrder.index(freq) < frequencyOrder.index(self.freq or 'D'):
+            raise ValueError('cannot resample %s data to %s' % (self.freq, freq))
+        periods = periodLabels(self.dates, freq)
+        starts = np.flatnonzero(np.r_[True, periods[1:] != periods[:-1]])
+        values = self.values if how in ('last', 'first', 'max', 'min') else self.values.astype(np.float64)
+        return Series(self.seriesId, periods[starts], aggregations[how](values, starts), freq)
+
+    # Date labels at the series' own granularity ('2020-11' for monthly data), as the spreadsheets wrote them
+    def labels(self):
+        return np.datetime_as_string(self.dates, unit='M' if self.freq == 'M' else 'D')
+
+
+class SeriesStore:
+
+    def __init__(self, series):
+        self.series = series
+
+    @classmethod
+    def fromFrames(cls, frames):
+        series = {}
+        for seriesId, (name, column) in definitions.items():
+            frame = frames[name]
+            dates = frame['Date'].to_numpy().astype('datetime64[D]')
+            series[seriesId] = Series(seriesId, dates, compactValues(frame[column].to_numpy()),
+                                      inferFrequency(dates))
+        return cls(series)
+
+    # A store with `series` (id -> Series) added to this one's
+    def withSeries(self, series):
+        return SeriesStore(dict(self.series, **series))
+
+    # From id -> (datetime64[D] dates, values), e.g. the arrays pipeline.py builds
+    @classmethod
+    def fromArrays(cls, arrays):
+        return cls({seriesId: Series(seriesId, dates, values, inferFrequency(dates))
+                    for seriesId, (dates, values) in arrays.items()})
+
+    def __getitem__(self, seriesId):
+        return self.series[seriesId]
+
+    def __contains__(self, seriesId):
+        return seriesId in self.series
+
+    def __iter__(self):
+        return iter(self.series)
+
+    @property
+    def nbytes(self):
+        return sum(series.nbytes for series in self.series.values())
@@ -0,0 +1,77 @@
+# COLORS & STYLE OF GRAPHS
+backgroundColor = 'white'
+textColor = '#282A2A'
+highlightColor = 'lightsteelblue'
+colorOne = 'mediumaquamarine'
+colorTwo = 'cornflowerblue'
+colorThree = 'indianred'
+
+quadBoxStyle = {'text-align': 'center',
+                'border': '1px #f9f9f9 solid',
+                'border-radius': 10,
+                'box-shadow': '10px 5px 8px #e6e6e6',
+                'background-color': 'white',
+                'padding': '2px'}
+
+tabsStyle = {'border': '1px #f9f9f9 solid',
+             'border-radius': 10,
+             'box-shadow': '10px 5px 8px #e6e6e6',
+             'background-color': 'white',
+             'padding': '20px',
+             'text-color': textColor}
+
+tabColors = {'border': 'white',
+             'primary': highlightColor,
+             'background': 'ghostwhite'}
+
+# Shared by every chart through the 'indicator' plotly template (see figures.py)
+fontFamily = 'Futura, Trebuchet MS, Verdana, Sans-serif'
+gridColor = '#e1e1e1'
+
+xaxisTemplateStyle = {'showline': True,
+                      'showgrid': False,
+                      'linecolor': textColor,
+                      'ticks': 'outside',
+                      'zeroline': False}
+
+yaxisTemplateStyle = {'fixedrange': True,
+                      'showline': False,
+                      'linecolor': textColor,
+                      'showgrid': True,
+                      'gridcolor': gridColor,
+                      'zeroline': False}
+
+marginStyle = {'t': 50, 'l': 20, 'r': 20}
+
+legendStyle = {'yanchor': 'bottom',
+               'y': 1.01,
+               'xanchor': 'center',
+               'x': .90}
+
+# Per-chart axis settings, on top of the template
+xaxisYearlyStyle = {'type': 'date',
+                    'tickformat': '%Y'}
+
+xaxisMonthlyStyle = {'type': 'date',
+                     'tickformat': '%b %d'}
+
+xaxisSectorStyle = {'title': 'Number of Jobs',
+                    'showgrid': True,
+                    'gridcolor': gridColor,
+                    'ticks': ''}
+
+xaxisSectorPercentStyle = dict(xaxisSectorStyle, title='%')
+
+yaxisStyle = {}
+
+yaxisPercentStyle = {'title': '%'}
+
+yaxisPerCapitaTitle = 'per 100k residents'
+
+yaxisSectorStyle = {'fixedrange': False,
+                    'showgrid': False}
+
+headerStyle = {'letter-spacing': '2px',
+               'font-weight': 'lighter',
+               'text-align': 'left'
+               }
@@ -0,0 +1,272 @@
+import argparse
+import hashlib
+import os
+import sys
+from datetime import date
+
+import numpy as np
+
+import loader
+import rolling
+import sectors
+from store import Series, compactValues, inferFrequency
+
+# VINTAGES
+# Payroll jobs, the sector levels and real GDP are revised after they are first published. The files in data/ hold the
+# latest release (ingest.py rewrites the rows a release revised); every release seen is kept here, per series, as an
+# append-only log of the observations that changed:
+#   data/vintages/<id>.vintages    records of (observation date, release date, value), 16 bytes each
+# A release only adds the observations that are new or differ from what the log already knew, so a monthly release
+# is a few records. ingest.py records each release it fetches; `python vintages.py` records what is in data/.
+vintageDir = os.environ.get('INDICATOR_VINTAGE_DIR', os.path.join(loader.dataDir, 'vintages'))
+
+# id -> (names in loader.sources, level column), merged like the sector files (sectors.sectorLevels)
+tracked = {
+    'PAYEMS': (['PayrollJobs'], 'Payroll Jobs'),
+    'GDP': (['realGDP'], 'Real GDP'),
+}
+tracked.update({'SECTOR_' + (column or names[0][len('sector_'):]): (names, column)
+                for names, column, _ in sectors.sectors})
+
+# Series computed from a tracked level as it was known, with rolling.backfill statistics or a percent change
+derived = {
+    'PAYEMS_1M': ('PAYEMS', 'change', 1),
+    'PAYEMS_12M': ('PAYEMS', 'change', 12),
+    'GDP_PCT': ('GDP', 'percent', 1),
+}
+
+labels = {'PAYEMS': 'Payroll jobs', 'PAYEMS_1M': 'Payroll jobs, 1 month change',
+          'PAYEMS_12M': 'Payroll jobs, 12 month change', 'GDP': 'Real GDP', 'GDP_PCT': 'Real GDP, % change'}
+labels.update({'SECTOR_' + (column or names[0][len('sector_'):]): 'Payroll jobs: ' + label
+               for names, column, label in sectors.sectors})
+
+recordType = np.dtype([('date', '<i4'), ('release', '<i4'), ('value', '<f8')])
+
+# a record's sort key is date * keyScale + release (release days are positive, after 1970)
+keyScale = 1 << 32
+
+
+def logPath(vintageId):
+    return os.path.join(vintageDir, vintageId + '.vintages')
+
+
+def days(dates):
+    return np.asarray(dates, dtype='datetime64[D]').astype(np.int64)
+
+
+def readRecords(vintageId):
+    try:
+        with open(logPath(vintageId), 'rb') as f:
+            raw = f.read()
+    except FileNotFoundError:
+        return np.empty(0, dtype=recordType)
+    # a write cut short leaves a partial record at the end
+    return np.frombuffer(raw[:len(raw) - len(raw) % recordType.itemsize], dtype=recordType)
+
+
+# Every release of one series. Only the change records are held: the value of an observation as known on a day is
+# its last record released on or before that day, found by binary search over the records sorted by (date, release).
+class Vintages:
+
+    def __init__(self, seriesId, records):
+        records = records[np.argsort(records['date'].astype(np.int64) * keyScale + records['release'], kind='stable')]
+        self.seriesId = seriesId
+        self.keys = records['date'].astype(np.int64) * keyScale + records['release']
+        self.values = records['value']
+        self.dates = np.unique(records['date']).astype(np.int64)
+        self.releases = np.unique(records['release']).astype('datetime64[D]')
+
+    @property
+    def nbytes(self):
+        return self.keys.nbytes + self.values.nbytes + self.dates.nbytes
+
+    # The series as it was known at the end of `day` (None: the latest release), or None before the first release
+    def asOf(self, day=None):
+        release = np.iinfo(np.int32).max if day is None else int(days(day))
+        positions = np.searchsorted(self.keys, self.dates * keyScale + release, side='right') - 1
+        known = positions >= 0
+        known[known] = self.keys[positions[known]] // keyScale == self.dates[known]
+        values = self.values[positions[known]]
+        present = np.isfinite(values)
+        if not present.any():
+            return None
+        dates = self.dates[known][present].astype('datetime64[D]')
+        return Series(self.seriesId, dates, compactValues(values[present]), inferFrequency(dates))
+
+    # Each observation's value in the release that first had it
+    def firstReported(self):
+        values = self.values[np.searchsorted(self.keys, self.dates * keyScale, side='left')]
+        present = np.isfinite(values)
+        dates = self.dates[present].astype('datetime64[D]')
+        return Series(self.seriesId, dates, compactValues(values[present]), inferFrequency(dates))
+
+    # The release day of each observation in firstReported()
+    def firstReleaseDays(self):
+        positions = np.searchsorted(self.keys, self.dates * keyScale, side='left')
+        return self.keys[positions][np.isfinite(self.values[positions])] % keyScale
+
+
+# The vintages of every tracked series that has a log
+class VintageStore:
+
+    def __init__(self, series, digest):
+        self.series = series
+        self.digest = digest
+
+    # None when nothing has been recorded yet
+    @classmethod
+    def load(cls):
+        series = {}
+        for vintageId in tracked:
+            records = readRecords(vintageId)
+            if len(records):
+                series[vintageId] = Vintages(vintageId, records)
+        if not series:
+            return None
+        # the logs are append-only, so their lengths identify their contents
+        digest = hashlib.sha1(''.join('%s=%d;' % (vintageId, len(vintages.keys))
+                                      for vintageId, vintages in sorted(series.items())).encode()).hexdigest()
+        return cls(series, digest)
+
+    def __contains__(self, seriesId):
+        return derived.get(seriesId, (seriesId,))[0] in self.series
+
+    def __iter__(self):
+        return (seriesId for seriesId in labels if seriesId in self)
+
+    @property
+    def nbytes(self):
+        return sum(vintages.nbytes for vintages in self.series.values())
+
+    def releases(self, seriesId):
+        return self.series[derived.get(seriesId, (seriesId,))[0]].releases
+
+    # `seriesId` as known on `day` (None: the latest release), or as first reported with day='first'. Derived
+    # series are computed from the level as it was known then: as first reported, an observation's change is taken
+    # from the levels of the release that first had it, when the observations before it may already be revised.
+    def asOf(self, seriesId, day=None):
+        source, statistic, window = derived.get(seriesId, (seriesId, None, None))
+        vintages = self.series[source]
+        if day != 'first':
+            levels = vintages.asOf(day)
+            if levels is None or statistic is None:
+                return levels
+            return Series(seriesId, levels.dates, derive(levels.values, statistic, window), levels.freq)
+        levels = vintages.firstReported()
+        if statistic is None:
+            return levels
+        releases = vintages.firstReleaseDays()
+        change = np.full(len(levels), np.nan)
+        for release in np.unique(releases):
+            first = releases == release
+            known = vintages.asOf(np.datetime64(int(release), 'D'))
+            change[first] = derive(known.values, statistic, window)[np.searchsorted(known.dates, levels.dates[first])]
+        return Series(seriesId, levels.dates, change, levels.freq)
+
+
+# A derived statistic (see `derived`) of levels
+def derive(levels, statistic, window):
+    values = np.asarray(levels, dtype=np.float64)
+    if statistic == 'percent':
+        change = np.full(len(values), np.nan)
+        change[window:] = (values[window:] / values[:-window] - 1) * 100
+        return change
+    return rolling.backfill(values, statistic, window)
+
+
+# RECORDING
+
+def trackedLevels(vintageId, frames):
+    levels = sectors.sectorLevels(frames, *tracked[vintageId]).dropna()
+    return levels.index.to_numpy().astype('datetime64[D]'), levels.to_numpy(dtype=np.float64)
+
+
+# Appends a release of `vintageId` (observation dates and values; a release may only cover recent dates) to its
+# log, released on `release` (default today). Returns the number of records written: observations that are new
+# or whose value changed.
+def record(vintageId, dates, values, release=None):
+    release = int(days(release or date.today()))
+    dates = days(dates)
+    values = np.asarray(values, dtype=np.float64)
+    latest = Vintages(vintageId, readRecords(vintageId)).asOf()
+    if latest is not None:
+        known = np.searchsorted(latest.dates.astype(np.int64), dates)
+        known = np.minimum(known, len(latest) - 1)
+        same = (latest.dates.astype(np.int64)[known] == dates) & \
+               np.isclose(latest.values.astype(np.float64)[known], values, rtol=1e-12, atol=0)
+        dates, values = dates[~same], values[~same]
+    if not len(dates):
+        return 0
+    records = np.empty(len(dates), dtype=recordType)
+    records['date'], records['release'], records['value'] = dates, release, values
+    os.makedirs(vintageDir, exist_ok=True)
+    with open(logPath(vintageId), 'ab') as f:
+        f.write(records.tobytes())
+    return len(records)
+
+
+# Cheap change detector, like loader.sourceSignature: the size of every log
+def signature():
+    sizes = []
+    for vintageId in tracked:
+        try:
+            sizes.append(os.path.getsize(logPath(vintageId)))
+        except FileNotFoundError:
+            sizes.append(None)
+    return tuple(sizes)
+
+
+def hasLog(vintageId):
+    return os.path.exists(logPath(vintageId))
+
+
+# Records the levels in data/ as a release of every tracked series (only what changed since the last one)
+def recordFrames(frames, release=None):
+    return {vintageId: record(vintageId, *trackedLevels(vintageId, frames), release=release)
+            for vintageId in tracked if all(name in frames for name in tracked[vintageId][0])}
+
+
+# CHECK
+# A revised history with known answers: the release that first has December also revises November, so December's
+# first-reported change is taken from the revised November (144,100,000 - 144,055,000), not November's first print.
+checkReleases = [('2019-12-06', {'2019-10-01': 143960000., '2019-11-01': 144020000.}),
+                 ('2020-01-10', {'2019-11-01': 144055000., '2019-12-01': 144100000.})]
+# (series, asOf day, observation) -> value
+checkExpected = {('PAYEMS', None, '2019-11-01'): 144055000., ('PAYEMS', 'first', '2019-11-01'): 144020000.,
+                 ('PAYEMS_1M', '2019-12-06', '2019-11-01'): 60000., ('PAYEMS_1M', None, '2019-12-01'): 45000.,
+                 ('PAYEMS_1M', 'first', '2019-11-01'): 60000., ('PAYEMS_1M', 'first', '2019-12-01'): 45000.}
+
+
+# Problems with the as-of lookups of checkReleases, for --check; none means they are right
+def checkProblems():
+    records = np.array([(days(day), days(release), value) for release, values in checkReleases
+                        for day, value in values.items()], dtype=recordType)
+    store = VintageStore({'PAYEMS': Vintages('PAYEMS', records)}, None)
+    problems = []
+    for (seriesId, day, observation), expected in checkExpected.items():
+        series = store.asOf(seriesId, day)
+        found = dict(zip(series.dates.astype(str), series.values.tolist())).get(observation)
+        if found != expected:
+            problems.append('%s %s as of %s is %s, expected %s' % (seriesId, observation, day or 'latest', found,
+                                                                  expected))
+    return problems
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Record the revised series in data/ as a release in data/vintages/')
+    parser.add_argument('--release', help='release date (default: today)')
+    parser.add_argument('--check', action='store_true',
+                        help='only check the as-of lookups against a revised history; exit 1 if they are wrong')
+    args = parser.parse_args()
+
+    if args.check:
+        problems = checkProblems()
+        for problem in problems:
+            print('vintages: ' + problem, file=sys.stderr)
+        sys.exit(1 if problems else 0)
+
+    frames, _ = loader.loadSources()
+    written = recordFrames(frames, args.release)
+    store = VintageStore.load()
+    for vintageId, count in written.items():
+        print('%-28s %5d records written, %3d releases' % (vintageId, count, len(store.releases(vintageId))))